@@ -0,0 +1,116 @@
+'''
+Microbenchmark for the batch message-processing stage.
+
+Compares the old per-message path (parse_tag, get_speaker_type and
+get_word_count called once per message, rows built from dict lookups)
+with `message_columns` plus the columnar row build in `write_to_db`, on
+the same synthetic messages. Database inserts are excluded; only the
+per-message Python work is timed.
+
+    python benchmarks/bench_message_batch.py --messages 200000
+'''
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from itertools import repeat
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lyra_analysis_app.ingest_transcripts_sqlite import (  # noqa: E402
+    get_speaker_id,
+    get_speaker_type,
+    get_word_count,
+    hash_text,
+    message_columns,
+    parse_tag,
+    setup_db,
+)
+
+VOCABULARY = "hello world lyra how are you today fine thanks tell me about the weather please sure".split()
+TAGS = ["[LLM]", "[Lyra Raw History]", "[System]"]
+
+
+def make_messages(n: int, n_users: int = 50, seed: int = 0):
+    rng = random.Random(seed)
+    tags, texts = [], []
+    for _ in range(n):
+        tags.append(f"[STT: user{rng.randrange(n_users)}]" if rng.random() < 0.5 else rng.choice(TAGS))
+        texts.append(" ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(1, 60))))
+    return tags, texts, list(map(hash_text, texts))
+
+
+def per_message(cursor, speaker_ids, tags, texts, text_hashes):
+    """The previous read_file + write_to_db build loop, one message at a time."""
+    messages = []
+    for position, (tag, text, text_hash) in enumerate(zip(tags, texts, text_hashes)):
+        role, name = parse_tag(tag)
+        messages.append({'tag': tag, 'role': role, 'name': name, 'text': text,
+                         'position': position, 'text_hash': text_hash})
+    rows = []
+    previous_id = None
+    for message_id, msg in enumerate(messages, start=1):
+        role = msg.get("role") or msg.get("tag")
+        speaker_type = get_speaker_type(msg.get("tag"))
+        speaker_id = get_speaker_id(cursor, speaker_type, msg.get("name") or role, speaker_ids)
+        rows.append((message_id, 1, msg.get("tag"), speaker_type, speaker_id, msg.get("position"), previous_id,
+                     msg.get("name"), msg.get("role"), msg.get("text"), msg.get("text_hash"),
+                     get_word_count(msg.get("text"))))
+        previous_id = message_id
+    return rows
+
+
+def batched(cursor, speaker_ids, tags, texts, text_hashes):
+    """`message_columns` followed by the columnar row build used by write_to_db."""
+    columns = message_columns(tags, texts, text_hashes=text_hashes)
+    n = len(tags)
+    message_ids = range(1, n + 1)
+    speaker_keys = list(zip(columns['speaker_type'], [
+        name or role for name, role in zip(columns['name'], columns['role'])
+    ]))
+    lookup = {key: get_speaker_id(cursor, key[0], key[1], speaker_ids) for key in dict.fromkeys(speaker_keys)}
+    return list(zip(
+        message_ids, repeat(1, n), columns['tag'], columns['speaker_type'],
+        list(map(lookup.__getitem__, speaker_keys)), columns['position'], [None, *message_ids[:-1]],
+        columns['name'], columns['role'], columns['text'], columns['text_hash'], columns['word_count']
+    ))
+
+
+def best_of(repeats, function, *args):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+    setup_db(conn, cursor)
+    speaker_ids = {}
+    tags, texts, text_hashes = make_messages(args.messages)
+
+    old_s, old_rows = best_of(args.repeats, per_message, cursor, speaker_ids, tags, texts, text_hashes)
+    new_s, new_rows = best_of(args.repeats, batched, cursor, speaker_ids, tags, texts, text_hashes)
+    if old_rows != new_rows:
+        sys.exit("FAIL: batch rows differ from per-message rows")
+
+    n = args.messages
+    print(f"{n} messages, best of {args.repeats}")
+    print(f"  per-message: {old_s:.3f}s  {1e9 * old_s / n:8.0f} ns/message")
+    print(f"  batch:       {new_s:.3f}s  {1e9 * new_s / n:8.0f} ns/message")
+    print(f"  speed-up     x{old_s / new_s:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+'''
+Query-level regression benchmark for the dashboard panels.
+
+Builds fixed-seed synthetic databases at several sizes with `ingest_data`
+(so changes to `setup_db` and the indexes are measured too), then times
+each Sentence Length / Word Analysis / Bigram Analysis panel end to end
+for Lyra, all users and the busiest single user: the queries `app.py`
+runs plus the DataFrame and row formatting it does, in both exact and
+sampling mode. Each panel is run `--repeats` times on a fresh connection
+(as `app.run_query` does) and the median latency is kept; peak Python
+memory (tracemalloc, so it excludes SQLite's page cache) is measured on
+a separate run. Each panel must also show rows: the same number as in
+the recorded baseline (the databases are fixed-seed), so a panel that
+breaks and returns nothing fails instead of getting faster. A sampled
+panel must not be slower than its exact counterpart (by more than
+SAMPLED_SLOWDOWN plus the latency floor); --record refuses such results
+as it refuses empty panels.
+
+Results are checked against the budgets in benchmarks/panel_budgets.json:
+
+    python benchmarks/bench_panel_queries.py                 # check, exit 1 on an overrun or wrong row count
+    python benchmarks/bench_panel_queries.py --record        # measure and store a new baseline
+    python benchmarks/bench_panel_queries.py --sizes small --workdir /tmp/lyra-panels
+
+A recorded budget is the baseline times the tolerance in the budgets
+file, with a floor so sub-millisecond panels don't fail on noise.
+Budgets are machine-dependent; re-record on the machine that runs the
+check. NLTK's punkt_tab data must be installed (it is downloaded if missing).
+'''
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import nltk
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lyra_analysis_app.ingest_transcripts_sqlite import ensure_tokenizer_data, ingest_data  # noqa: E402
+from lyra_analysis_app.query_service import run_local_query  # noqa: E402
+
+BUDGETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "panel_budgets.json")
+
+# Number of transcript files per size; ~25 messages each.
+SIZES = {'small': 100, 'medium': 400, 'large': 1600}
+
+TOLERANCE = {'latency': 2.0, 'latency_floor_ms': 5.0, 'memory': 1.5, 'memory_floor_kib': 256}
+
+# Sampling mode exists to be faster: a sampled panel fails if it takes longer
+# than this multiple of the exact panel's latency (plus the latency floor).
+SAMPLED_SLOWDOWN = 1.25
+
+VOCABULARY = (
+    "hello world lyra how are you today fine thanks tell me about the weather "
+    "please sure it is sunny what do think remember yesterday we talked music "
+    "really interesting story again could help with plan tomorrow morning"
+).split()
+
+
+def write_corpus(path: str, n_files: int, n_users: int = 200, seed: int = 0):
+    """Writes `n_files` transcripts; user0 is the busiest user, user activity falls off steeply."""
+    rng = random.Random(seed)
+    for index in range(n_files):
+        lines = ["header"]
+        for _ in range(rng.randint(15, 35)):
+            if rng.random() < 0.5:
+                tag = f"[STT: user{int(n_users * rng.random() ** 3)}]"
+            else:
+                tag = rng.choice(["[LLM]", "[LLM]", "[Lyra Raw History]", "[System]"])
+            lines.append(f"{tag}\n" + " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(1, 80))) + ".")
+        day = 1 + index % 28
+        minutes, seconds = divmod(index // 28, 60)
+        with open(os.path.join(path, f"transcript-202501{day:02d}-{minutes // 60:02d}{minutes % 60:02d}{seconds:02d}.txt"), "w") as f:
+            f.write("\n".join(lines))
+
+
+def build_db(workdir: str, size: str):
+    """Returns the database for `size`, building it unless `workdir` already has it."""
+    db_path = os.path.join(workdir, f"panels_{size}.db")
+    if os.path.exists(db_path):
+        return db_path
+    data_path = os.path.join(workdir, f"TRANSCRIPTS_{size}")
+    os.makedirs(data_path, exist_ok=True)
+    write_corpus(data_path, SIZES[size])
+    ingest_data(data_path, db_path)
+    shutil.rmtree(data_path, ignore_errors=True)
+    return db_path
+
+
+# The panels below mirror app.py minus the st.* calls. Each returns the rows
+# it would display (the longest messages for Sentence Length), or [] if the
+# panel would show no data.
+
+def sentence_length_panel(conn, speaker_type, speaker_id):
+    percentiles = run_local_query(conn, "percentiles", speaker_type=speaker_type, speaker_id=speaker_id)
+    top_messages = run_local_query(
+        conn, "longest_messages", speaker_type=speaker_type, percentile=0.95, speaker_id=speaker_id
+    )
+    if percentiles['p50'] is None:
+        return []
+    return [f"{i}. {msg}" for i, msg in enumerate(top_messages, start=1)]
+
+
+def phrase_panel(num_words):
+    def panel(conn, speaker_type, speaker_id):
+        phrase_freqs = run_local_query(
+            conn, "phrase_frequencies", speaker_type=speaker_type, limit=50, num_words=num_words, speaker_id=speaker_id
+        )
+        return pd.DataFrame(phrase_freqs, columns=["Phrase", "Frequency"])
+    return panel
+
+
+def sampled_sentence_length_panel(conn, speaker_type, speaker_id):
+    result = run_local_query(conn, "percentiles_sampled", speaker_type=speaker_type, speaker_id=speaker_id)
+    table = pd.DataFrame(
+        [(key, value, *result['intervals'][key]) for key, value in result['percentiles'].items()],
+        columns=["Percentile", "Estimate", "Low (95%)", "High (95%)"]
+    )
+    top_messages = run_local_query(
+        conn, "longest_messages_sampled", speaker_type=speaker_type, percentile=0.95, speaker_id=speaker_id
+    )
+    if table.empty or table["Estimate"].isna().all():
+        return []
+    return [f"{i}. {msg}" for i, msg in enumerate(top_messages, start=1)]
+
+
+def sampled_phrase_panel(num_words):
+    def panel(conn, speaker_type, speaker_id):
+        rows = run_local_query(
+            conn, "phrase_frequencies_sampled", speaker_type=speaker_type, limit=50, num_words=num_words,
+            speaker_id=speaker_id
+        )
+        return pd.DataFrame(rows, columns=["Phrase", "Estimate", "Low (95%)", "High (95%)"])
+    return panel
+
+
+PANELS = {
+    'Sentence Length': sentence_length_panel,
+    'Word Analysis': phrase_panel(1),
+    'Bigram Analysis': phrase_panel(2),
+    'Sentence Length (sampled)': sampled_sentence_length_panel,
+    'Word Analysis (sampled)': sampled_phrase_panel(1),
+    'Bigram Analysis (sampled)': sampled_phrase_panel(2),
+}
+
+
+def speakers(db_path: str):
+    """(label, speaker_type, speaker_id) for the speaker dropdown choices."""
+    with sqlite3.connect(db_path) as conn:
+        users = {name: s_id for s_id, _, name in run_local_query(conn, "speakers", speaker_type="user")}
+    return [('lyra', 'lyra', None), ('user', 'user', None), ('user0', 'user', users['user0'])]
+
+
+def run_panel(db_path, panel, speaker_type, speaker_id):
+    with sqlite3.connect(db_path) as conn:
+        return panel(conn, speaker_type, speaker_id)
+
+
+def measure(db_path: str, panel, speaker_type, speaker_id, repeats: int):
+    # The first run also warms the OS page cache.
+    rows = len(run_panel(db_path, panel, speaker_type, speaker_id))
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run_panel(db_path, panel, speaker_type, speaker_id)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    run_panel(db_path, panel, speaker_type, speaker_id)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'latency_ms': 1000 * statistics.median(timings), 'peak_kib': peak / 1024, 'rows': rows}
+
+
+def slower_sampled(results: dict, tolerance: dict):
+    """Returns {key: exact latency_ms} for the sampled panels slower than their exact counterpart."""
+    slower = {}
+    for key, measured in results.items():
+        size, name, label = key.split("/")
+        if not name.endswith(" (sampled)"):
+            continue
+        exact = results.get(f"{size}/{name[:-len(' (sampled)')]}/{label}")
+        if exact is not None and (
+            measured['latency_ms'] > exact['latency_ms'] * SAMPLED_SLOWDOWN + tolerance['latency_floor_ms']
+        ):
+            slower[key] = exact['latency_ms']
+    return slower
+
+
+def budget_for(baseline: dict, tolerance: dict):
+    return {
+        'latency_ms': round(max(baseline['latency_ms'] * tolerance['latency'],
+                                baseline['latency_ms'] + tolerance['latency_floor_ms']), 2),
+        'peak_kib': round(max(baseline['peak_kib'] * tolerance['memory'],
+                              baseline['peak_kib'] + tolerance['memory_floor_kib']), 1),
+    }
+
+
+def load_budgets(path: str):
+    if not os.path.exists(path):
+        return {'tolerance': dict(TOLERANCE), 'entries': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--budgets", default=BUDGETS_PATH, help="budgets file (default: benchmarks/panel_budgets.json)")
+    parser.add_argument("--record", action="store_true", help="store the measurements as the new baseline")
+    parser.add_argument("--workdir", default=None,
+                        help="keep the synthetic databases here and reuse them (default: a temp dir)")
+    args = parser.parse_args()
+    ensure_tokenizer_data()
+
+    budgets = load_budgets(args.budgets)
+    tolerance = budgets.setdefault('tolerance', dict(TOLERANCE))
+    entries = budgets.setdefault('entries', {})
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="lyra-panels-")
+    os.makedirs(workdir, exist_ok=True)
+    results = {}
+    try:
+        for size in args.sizes:
+            start = time.perf_counter()
+            db_path = build_db(workdir, size)
+            print(f"{size}: {SIZES[size]} files, {os.path.getsize(db_path) / 2**20:.1f} MiB "
+                  f"(ready in {time.perf_counter() - start:.1f}s)")
+            for label, speaker_type, speaker_id in speakers(db_path):
+                for name, panel in PANELS.items():
+                    results[f"{size}/{name}/{label}"] = measure(db_path, panel, speaker_type, speaker_id, args.repeats)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    empty = [key for key, measured in results.items() if not measured['rows']]
+    if args.record and empty:
+        sys.exit(f"FAIL: not recording, these panels returned no rows: {', '.join(empty)}")
+    slower = slower_sampled(results, tolerance)
+    if args.record and slower:
+        sys.exit(f"FAIL: not recording, these sampled panels are slower than exact: {', '.join(slower)}")
+
+    if args.record:
+        for key, measured in results.items():
+            baseline = {
+                'latency_ms': round(measured['latency_ms'], 3),
+                'peak_kib': round(measured['peak_kib'], 1),
+                'rows': measured['rows'],
+            }
+            entries[key] = {'baseline': baseline, 'budget': budget_for(baseline, tolerance)}
+        budgets['recorded'] = {
+            'date': datetime.date.today().isoformat(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'nltk': nltk.__version__,
+            'machine': platform.platform(),
+            'repeats': args.repeats,
+        }
+        with open(args.budgets, "w") as f:
+            json.dump(budgets, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    failures = []
+    missing = []
+    width = max(map(len, results))
+    print(f"\n{'panel':<{width}} {'ms':>9} {'base ms':>9} {'budget':>9} {'KiB':>9} {'base KiB':>9} {'budget':>9} "
+          f"{'rows':>5} {'base':>5}")
+    for key, measured in results.items():
+        entry = entries.get(key)
+        if entry is None:
+            missing.append(key)
+            problems = [] if measured['rows'] else ['rows']
+            if key in slower:
+                problems.append('sampled')
+            if problems:
+                failures.append((key, measured, None, None, problems))
+            print(f"{key:<{width}} {measured['latency_ms']:>9.2f} {'-':>9} {'-':>9} {measured['peak_kib']:>9.0f} "
+                  f"{'-':>9} {'-':>9} {measured['rows']:>5} {'-':>5}")
+            continue
+        baseline, budget = entry['baseline'], entry['budget']
+        over = [
+            metric for metric in ('latency_ms', 'peak_kib') if measured[metric] > budget[metric]
+        ]
+        if not measured['rows'] or measured['rows'] != baseline.get('rows', measured['rows']):
+            over.append('rows')
+        if key in slower:
+            over.append('sampled')
+        if over:
+            failures.append((key, measured, baseline, budget, over))
+        print(f"{key:<{width}} {measured['latency_ms']:>9.2f} {baseline['latency_ms']:>9.2f} {budget['latency_ms']:>9.2f} "
+              f"{measured['peak_kib']:>9.0f} {baseline['peak_kib']:>9.0f} {budget['peak_kib']:>9.0f} "
+              f"{measured['rows']:>5} {baseline.get('rows', '-'):>5}"
+              + (f"  FAIL ({', '.join(over)})" if over else ""))
+
+    if args.record:
+        print(f"\nRecorded {len(results)} baselines in {args.budgets}")
+        return
+    if missing:
+        print(f"\n{len(missing)} panels have no recorded budget; run with --record to add them.")
+    if failures:
+        print(f"\nFAIL: {len(failures)} panels over budget or with wrong results")
+        for key, measured, baseline, budget, over in failures:
+            for metric in over:
+                if metric == 'rows':
+                    expected = baseline.get('rows') if baseline else None
+                    print(f"  {key}: returned {measured['rows']} rows"
+                          + (f", baseline returned {expected}" if expected is not None else ", expected some"))
+                    continue
+                if metric == 'sampled':
+                    print(f"  {key}: {measured['latency_ms']:.2f} ms, slower than the exact panel's "
+                          f"{slower[key]:.2f} ms")
+                    continue
+                unit = "ms" if metric == 'latency_ms' else "KiB"
+                print(f"  {key}: {metric} {measured[metric]:.2f} {unit} > budget {budget[metric]:.2f} {unit} "
+                      f"(baseline {baseline[metric]:.2f} {unit}, x{measured[metric] / baseline[metric]:.1f})")
+        if 'recorded' in budgets:
+            recorded = budgets['recorded']
+            print(f"  baseline recorded {recorded['date']} on {recorded['machine']} "
+                  f"(Python {recorded['python']}, SQLite {recorded['sqlite']}, NLTK {recorded.get('nltk', '?')})")
+        sys.exit(1)
+    print("\nOK: every panel within budget and showing its baseline rows")
+
+
+if __name__ == "__main__":
+    main()
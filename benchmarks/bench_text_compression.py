@@ -0,0 +1,137 @@
+'''
+Compressed text storage benchmark.
+
+Writes a synthetic corpus in which every few turns Lyra repeats the recent
+conversation as a '[Lyra Raw History]' block, ingests it once per codec
+(lazy phrase mode, so the database is mostly `messages.text`) and reports
+the database size and the cost of decompressing the messages the
+longest-messages panel displays.
+
+Exits non-zero if the panel returns no messages, or different messages
+for different codecs.
+
+    python benchmarks/bench_text_compression.py --files 200
+
+zstd is skipped unless the zstandard package is installed.
+'''
+
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lyra_analysis_app.ingest_transcripts_sqlite import IngestOptions, ingest_data, text_decoder, zstandard  # noqa: E402
+from lyra_analysis_app.run_dashboard import get_messages_above_percentile_sqlite  # noqa: E402
+
+VOCABULARY = (
+    "hello world lyra how are you today fine thanks tell me about the weather "
+    "please sure it is sunny what do think remember yesterday we talked music "
+    "really interesting story again could help with plan tomorrow morning"
+).split()
+
+
+def write_corpus(path: str, n_files: int, turns: int = 60, history_every: int = 10, seed: int = 0):
+    rng = random.Random(seed)
+    for index in range(n_files):
+        lines = ["header"]
+        recent = []
+        for turn in range(turns):
+            for tag in (f"[STT: user{rng.randrange(20)}]", "[LLM]"):
+                text = " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(3, 80))) + "."
+                lines.append(f"{tag}\n{text}")
+                recent.append(f"{tag} {text}")
+            if turn % history_every == history_every - 1:
+                lines.append("[Lyra Raw History]\n" + "\n".join(recent[-40:]))
+        minutes, seconds = divmod(index, 60)
+        with open(os.path.join(path, f"transcript-20250101-{minutes // 60:02d}{minutes % 60:02d}{seconds:02d}.txt"), "w") as f:
+            f.write("\n".join(lines))
+
+
+def measure(data_path: str, db_path: str, codec: str, repeats: int):
+    start = time.perf_counter()
+    ingest_data(data_path, db_path, IngestOptions(phrase_mode="lazy", text_compression=codec))
+    ingest_s = time.perf_counter() - start
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("VACUUM;")
+    cursor.execute("SELECT SUM(LENGTH(CAST(text AS BLOB))) FROM messages")
+    text_bytes = cursor.fetchone()[0]
+
+    # Decompression cost per displayed message: decode the rows the
+    # longest-messages panel shows, without the query around it.
+    cursor.execute("SELECT text FROM messages WHERE speaker_type = 'lyra' ORDER BY word_count DESC LIMIT 500")
+    stored = [row[0] for row in cursor.fetchall()]
+    decode = text_decoder(cursor)
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for value in stored:
+            decode(value)
+        best = min(best, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    shown = get_messages_above_percentile_sqlite(conn, cursor, "lyra", percentile=0.95)
+    panel_s = time.perf_counter() - start
+    conn.close()
+    return {
+        'codec': codec,
+        'db_mb': os.path.getsize(db_path) / 2**20,
+        'text_mb': text_bytes / 2**20,
+        'ingest_s': ingest_s,
+        'decode_us': 1e6 * best / max(len(stored), 1),
+        'panel_ms': 1000 * panel_s,
+        'panel_rows': len(shown),
+        'panel_messages': shown,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--workdir", default=None, help="where to write the corpus and dbs (default: a temp dir)")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="lyra-compression-")
+    data_path = os.path.join(workdir, "TRANSCRIPTS")
+    os.makedirs(data_path, exist_ok=True)
+    codecs = ["none", "zlib"] + (["zstd"] if zstandard is not None else [])
+    try:
+        write_corpus(data_path, args.files)
+        results = [
+            measure(data_path, os.path.join(workdir, f"lyra_{codec}.db"), codec, args.repeats)
+            for codec in codecs
+        ]
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = results[0]
+    print(f"{'codec':>6} {'db MiB':>8} {'text MiB':>9} {'vs none':>8} {'ingest s':>9} {'decode us/msg':>14} "
+          f"{'panel ms':>9} {'rows':>6}")
+    for result in results:
+        print(
+            f"{result['codec']:>6} {result['db_mb']:>8.1f} {result['text_mb']:>9.1f} "
+            f"{result['db_mb'] / baseline['db_mb']:>7.0%} {result['ingest_s']:>9.2f} "
+            f"{result['decode_us']:>14.1f} {result['panel_ms']:>9.1f} {result['panel_rows']:>6}"
+        )
+    if zstandard is None:
+        print("(zstd skipped: zstandard is not installed)")
+
+    # The panel timing only means something if every codec returned the same, non-empty messages.
+    if baseline['panel_rows'] == 0:
+        sys.exit("FAIL: the longest-messages panel returned no rows")
+    for result in results[1:]:
+        if result['panel_messages'] != baseline['panel_messages']:
+            sys.exit(f"FAIL: the longest-messages panel differs between 'none' and {result['codec']!r}")
+
+
+if __name__ == "__main__":
+    main()
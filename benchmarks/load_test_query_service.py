@@ -0,0 +1,142 @@
+'''
+Load test for the query service.
+
+Starts `python -m lyra_analysis_app serve` on the given database (or uses
+an already running service via --url), then simulates N concurrent
+dashboard users, each issuing the panel queries back to back, and prints
+requests/s and latency per concurrency level.
+
+    python benchmarks/load_test_query_service.py --db lyra_transcripts.db --cache-size 0
+
+Use --cache-size 0 to measure the read-only connection pool itself;
+with the cache on, repeated panels are served without touching SQLite.
+'''
+
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lyra_analysis_app.query_service import QueryClient  # noqa: E402
+
+PANEL_QUERIES = [
+    ("percentiles", {"speaker_type": "user"}),
+    ("percentiles", {"speaker_type": "lyra"}),
+    ("longest_messages", {"speaker_type": "user", "percentile": 0.95}),
+    ("phrase_frequencies", {"speaker_type": "user", "num_words": 1, "limit": 50}),
+    ("phrase_frequencies", {"speaker_type": "lyra", "num_words": 1, "limit": 50}),
+    ("phrase_frequencies", {"speaker_type": "user", "num_words": 2, "limit": 50}),
+    ("phrase_frequencies", {"speaker_type": "lyra", "num_words": 2, "limit": 50}),
+    ("turn_summary", {}),
+]
+
+
+def wait_until_up(client, server=None, server_log=None, timeout=30.0):
+    """Waits for /health; fails early with the server's exit code and stderr if it exits first."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if server is not None and server.poll() is not None:
+            server_log.seek(0)
+            stderr = server_log.read().decode(errors="replace").strip()
+            raise RuntimeError(f"query service exited with code {server.returncode}" + (f":\n{stderr}" if stderr else ""))
+        try:
+            client.get("/health")
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("query service did not start")
+
+
+def run_level(client, users, duration, seed=0):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def user(index):
+        rng = random.Random(seed + index)
+        local = []
+        while time.perf_counter() < stop_at:
+            name, params = rng.choice(PANEL_QUERIES)
+            start = time.perf_counter()
+            try:
+                client.call(name, **params)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+                continue
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        'users': users,
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': len(latencies) / duration,
+        'p50_ms': 1000 * statistics.median(latencies) if latencies else None,
+        'p95_ms': 1000 * latencies[int(0.95 * (len(latencies) - 1))] if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="lyra_transcripts.db")
+    parser.add_argument("--url", default=None, help="use a running service instead of starting one")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--pool-size", type=int, default=8)
+    parser.add_argument("--cache-size", type=int, default=0)
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per concurrency level")
+    args = parser.parse_args()
+
+    server = None
+    server_log = None
+    url = args.url
+    if url is None:
+        url = f"http://127.0.0.1:{args.port}"
+        # The server runs from the repo root, so the database path must not be relative.
+        server_log = tempfile.TemporaryFile()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "lyra_analysis_app", "serve", "--db", os.path.abspath(args.db),
+             "--port", str(args.port), "--pool-size", str(args.pool_size), "--cache-size", str(args.cache_size)],
+            cwd=ROOT, stderr=server_log
+        )
+
+    client = QueryClient(url)
+    try:
+        wait_until_up(client, server, server_log)
+        print(f"{'users':>6} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+        baseline = None
+        for users in args.users:
+            result = run_level(client, users, args.duration)
+            baseline = baseline or result['rps']
+            print(
+                f"{result['users']:>6} {result['requests']:>9} {result['errors']:>7} {result['rps']:>9.1f} "
+                f"{result['p50_ms'] or 0:>8.1f} {result['p95_ms'] or 0:>8.1f}   x{result['rps'] / baseline:.2f}"
+            )
+        print("service stats:", client.stats())
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+            server_log.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+'''
+Local stand-in for a distributed sharded ingest.
+
+Writes a synthetic corpus (spread over several days, with some duplicate
+transcripts), runs one `python -m lyra_analysis_app ingest --shard ...`
+process per shard in parallel as stand-ins for ingest nodes, merges the
+shard databases and checks that the merged database and a fan-out
+connection over the shards answer every panel query exactly like a
+single-host ingest of the same corpus. Text is stored zlib-compressed by
+default, so every shard has its own trained dictionary and the merge
+and fan-out decoding paths are exercised. With `--phrase-mode lazy` the
+shards' phrase caches are filled before the merge, so the merged
+database starts from the summed shard counts.
+
+    python benchmarks/shard_demo.py --shards 4 --files 120
+    python benchmarks/shard_demo.py --shards 3 --by date --text-compression none
+    python benchmarks/shard_demo.py --shards 3 --by date --phrase-mode lazy
+
+Exits non-zero if any query differs, or if a longest-messages query
+returns nothing (an empty result would trivially match).
+'''
+
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lyra_analysis_app.query_service import run_local_query  # noqa: E402
+from lyra_analysis_app.shards import connect_shards  # noqa: E402
+
+VOCABULARY = (
+    "hello world lyra how are you today fine thanks tell me about the weather "
+    "please sure it is sunny what do think remember yesterday we talked music"
+).split()
+
+
+def write_corpus(path: str, n_files: int, n_days: int, n_users: int = 12, duplicate_every: int = 10, seed: int = 0):
+    rng = random.Random(seed)
+    previous = None
+    for index in range(n_files):
+        day = 1 + index % n_days
+        name = f"transcript-202501{day:02d}-{index // 3600:02d}{index // 60 % 60:02d}{index % 60:02d}.txt"
+        if previous is not None and index % duplicate_every == 0:
+            text = previous  # same content under another name
+        else:
+            lines = ["header"]
+            for _ in range(rng.randint(10, 40)):
+                tag = f"[STT: user{rng.randrange(n_users)}]" if rng.random() < 0.5 else rng.choice(
+                    ["[LLM]", "[Lyra Raw History]", "[System]"]
+                )
+                lines.append(f"{tag}\n" + " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(1, 60))) + ".")
+            text = "\n".join(lines)
+        with open(os.path.join(path, name), "w") as f:
+            f.write(text)
+        previous = text
+
+
+def shard_specs(by: str, n_shards: int, n_days: int):
+    if by == "hash":
+        return [f"hash:{i}/{n_shards}" for i in range(n_shards)]
+    per_shard = math.ceil(n_days / n_shards)
+    return [
+        f"date:202501{1 + i * per_shard:02d}-202501{min((i + 1) * per_shard, n_days):02d}"
+        for i in range(n_shards)
+        if 1 + i * per_shard <= n_days
+    ]
+
+
+def ingest(data_path: str, db_path: str, shard: str = None, text_compression: str = "zlib", phrase_mode: str = "eager"):
+    command = [sys.executable, "-m", "lyra_analysis_app", "ingest", data_path, "--db", db_path,
+               "--metrics", db_path + ".metrics.json", "--text-compression", text_compression,
+               "--phrase-mode", phrase_mode]
+    if shard:
+        command += ["--shard", shard]
+    return subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def panel_results(conn):
+    """Every panel query, normalized so id order and tie order don't matter."""
+    names = {s_id: name for s_id, _, name in run_local_query(conn, "speakers")}
+    results = {}
+    for speaker_type in ("user", "lyra"):
+        results[f"percentiles/{speaker_type}"] = run_local_query(conn, "percentiles", speaker_type=speaker_type)
+        results[f"longest/{speaker_type}"] = sorted(
+            run_local_query(conn, "longest_messages", speaker_type=speaker_type, percentile=0.9)
+        )
+        for num_words in (1, 2):
+            results[f"phrases{num_words}/{speaker_type}"] = sorted(
+                run_local_query(conn, "phrase_frequencies", speaker_type=speaker_type, num_words=num_words, limit=-1)
+            )
+    results["turns"] = sorted(run_local_query(conn, "turn_pairs"))
+    for s_id, name in sorted(names.items(), key=lambda item: item[1])[:3]:
+        results[f"percentiles/{name}"] = run_local_query(conn, "percentiles", speaker_id=s_id)
+        results[f"turns/{name}"] = sorted(run_local_query(conn, "turn_pairs", speaker_id=s_id))
+    results["speakers"] = sorted(names.values())
+    return json.loads(json.dumps(results, default=float))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--by", choices=["hash", "date"], default="hash")
+    parser.add_argument("--files", type=int, default=120)
+    parser.add_argument("--days", type=int, default=6)
+    parser.add_argument("--text-compression", choices=["none", "zlib", "zstd"], default="zlib")
+    parser.add_argument("--phrase-mode", choices=["eager", "lazy"], default="eager")
+    parser.add_argument("--workdir", default=None, help="where to write the corpus and dbs (default: a temp dir)")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="lyra-shards-")
+    data_path = os.path.join(workdir, "TRANSCRIPTS")
+    os.makedirs(data_path, exist_ok=True)
+    try:
+        write_corpus(data_path, args.files, args.days)
+        specs = shard_specs(args.by, args.shards, args.days)
+        shard_paths = [os.path.join(workdir, f"shard{i}.db") for i in range(len(specs))]
+
+        start = time.perf_counter()
+        nodes = [
+            ingest(data_path, path, spec, args.text_compression, args.phrase_mode)
+            for path, spec in zip(shard_paths, specs)
+        ]
+        if any(node.wait() for node in nodes):
+            sys.exit("FAIL: a shard ingest failed")
+        sharded_s = time.perf_counter() - start
+        if args.phrase_mode == "lazy":
+            # Fill every shard's phrase cache, as queries against the shards would.
+            for path in shard_paths:
+                with sqlite3.connect(path) as conn:
+                    panel_results(conn)
+
+        merged_path = os.path.join(workdir, "merged.db")
+        start = time.perf_counter()
+        merge = subprocess.run(
+            [sys.executable, "-m", "lyra_analysis_app", "merge", merged_path] + shard_paths,
+            cwd=ROOT, capture_output=True, text=True
+        )
+        if merge.returncode:
+            sys.exit(f"FAIL: merge failed\n{merge.stderr}")
+        merge_s = time.perf_counter() - start
+
+        single_path = os.path.join(workdir, "single.db")
+        start = time.perf_counter()
+        if ingest(data_path, single_path, text_compression=args.text_compression, phrase_mode=args.phrase_mode).wait():
+            sys.exit("FAIL: single-host ingest failed")
+        single_s = time.perf_counter() - start
+
+        print(f"{len(specs)} shards ({', '.join(specs)})")
+        print(f"  sharded ingest {sharded_s:.2f}s + merge {merge_s:.2f}s, single host {single_s:.2f}s")
+        print(f"  merge: {merge.stdout.strip()}")
+
+        with sqlite3.connect(single_path) as conn:
+            expected = panel_results(conn)
+        with sqlite3.connect(merged_path) as conn:
+            merged = panel_results(conn)
+        fan_out_conn = connect_shards(shard_paths)
+        fan_out = panel_results(fan_out_conn)
+        fan_out_conn.close()
+
+        failures = 0
+        for label, results in (("single", expected), ("merged", merged), ("fan-out", fan_out)):
+            empty = [key for key, value in results.items() if key.startswith("longest/") and not value]
+            if empty:
+                failures += len(empty)
+                print(f"  {label:>8}: no messages returned for {', '.join(empty)}")
+        for label, results in (("merged", merged), ("fan-out", fan_out)):
+            differing = [key for key in expected if results.get(key) != expected[key]]
+            failures += len(differing)
+            print(f"  {label:>8}: {len(expected) - len(differing)}/{len(expected)} queries match single-host"
+                  + (f"; differ: {', '.join(differing)}" if differing else ""))
+        if failures:
+            sys.exit(1)
+        print("OK")
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
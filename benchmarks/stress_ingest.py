@@ -0,0 +1,151 @@
+'''
+Memory-bounded ingest stress test.
+
+Generates a synthetic transcript corpus several times larger than the
+host's RAM (or a simulated RAM size), ingests it with
+`IngestOptions(chunk_size=..., memory_budget=...)` in a child process
+and checks that the child's peak RSS stays under a cap.
+
+    python benchmarks/stress_ingest.py --ram-mb 256 --rss-cap-mb 384
+
+Exits non-zero if the peak RSS exceeds the cap.
+'''
+
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+VOCABULARY = (
+    "hello world lyra how are you today fine thanks tell me about the weather "
+    "please sure it is sunny what do think remember yesterday we talked music "
+    "really interesting story again could help with plan tomorrow morning"
+).split()
+
+TAGS = ["[LLM]", "[Lyra Raw History]", "[System]"]
+
+
+def physical_ram_mb():
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+
+
+def write_corpus(path: str, corpus_mb: int, file_kb: int = 256, n_users: int = 1000, seed: int = 0):
+    """Writes ~`corpus_mb` MiB of transcripts of ~`file_kb` KiB each into `path`."""
+    rng = random.Random(seed)
+    target = corpus_mb * 1024 * 1024
+    written = 0
+    n_files = 0
+    while written < target:
+        day = 1 + (n_files // 86400) % 28
+        minutes, seconds = divmod(n_files % 86400, 60)
+        hours, minutes = divmod(minutes, 60)
+        file_path = os.path.join(path, f"transcript-202501{day:02d}-{hours:02d}{minutes:02d}{seconds:02d}.txt")
+        lines = ["header"]
+        size = 0
+        while size < file_kb * 1024:
+            if rng.random() < 0.5:
+                tag = f"[STT: user{rng.randrange(n_users)}]"
+            else:
+                tag = rng.choice(TAGS)
+            text = " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(1, 120))) + "."
+            lines.append(f"{tag}\n{text}")
+            size += len(tag) + len(text) + 2
+        with open(file_path, "w") as f:
+            f.write("\n".join(lines))
+        written += size
+        n_files += 1
+    return n_files, written
+
+
+def _run_ingest(data_path, db_path, chunk_size, memory_budget):
+    from lyra_analysis_app.ingest_transcripts_sqlite import IngestOptions, ingest_data
+
+    ingest_data(data_path, db_path, IngestOptions(
+        chunk_size=chunk_size,
+        memory_budget=memory_budget,
+        metrics_path=os.path.join(os.path.dirname(db_path), "ingest_metrics.json")
+    ))
+
+
+def _sample_rss(pid, samples, stop):
+    status_path = f"/proc/{pid}/status"
+    while not stop.is_set():
+        try:
+            with open(status_path) as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        samples.append(int(line.split()[1]) // 1024)
+                        break
+        except OSError:
+            break
+        time.sleep(0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ram-mb", type=int, default=None, help="RAM to size the corpus against (default: physical RAM)")
+    parser.add_argument("--multiple", type=float, default=10.0, help="corpus size as a multiple of --ram-mb")
+    parser.add_argument("--corpus-mb", type=int, default=None, help="explicit corpus size, overrides --ram-mb/--multiple")
+    parser.add_argument("--rss-cap-mb", type=int, default=512, help="fail if the ingest's peak RSS exceeds this")
+    parser.add_argument("--memory-budget-mb", type=int, default=64)
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--workdir", default=None, help="where to write the corpus and db (default: a temp dir)")
+    parser.add_argument("--keep", action="store_true", help="keep the corpus and db afterwards")
+    args = parser.parse_args()
+
+    ram_mb = args.ram_mb or physical_ram_mb()
+    corpus_mb = args.corpus_mb or int(ram_mb * args.multiple)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="lyra-stress-")
+    data_path = os.path.join(workdir, "TRANSCRIPTS")
+    os.makedirs(data_path, exist_ok=True)
+    db_path = os.path.join(workdir, "lyra_transcripts.db")
+
+    try:
+        print(f"Writing {corpus_mb} MiB synthetic corpus to {data_path} ...")
+        n_files, written = write_corpus(data_path, corpus_mb)
+        print(f"  {n_files} files, {written / 2**20:.0f} MiB")
+
+        process = multiprocessing.Process(
+            target=_run_ingest,
+            args=(data_path, db_path, args.chunk_size, args.memory_budget_mb * 1024 * 1024)
+        )
+        start = time.perf_counter()
+        process.start()
+        samples = []
+        stop = threading.Event()
+        sampler = threading.Thread(target=_sample_rss, args=(process.pid, samples, stop), daemon=True)
+        sampler.start()
+        process.join()
+        stop.set()
+        elapsed = time.perf_counter() - start
+
+        # ru_maxrss is in KiB on Linux.
+        peak_mb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // 1024
+        print(f"Ingest exit code {process.exitcode} after {elapsed:.1f}s")
+        if samples:
+            quarter = max(len(samples) // 4, 1)
+            print(f"RSS MiB: first quarter max {max(samples[:quarter])}, last quarter max {max(samples[-quarter:])}")
+        print(f"Peak RSS {peak_mb} MiB (cap {args.rss_cap_mb} MiB), DB {os.path.getsize(db_path) / 2**20:.0f} MiB")
+
+        if process.exitcode != 0:
+            sys.exit(process.exitcode or 1)
+        if peak_mb > args.rss_cap_mb:
+            print("FAIL: peak RSS exceeded cap")
+            sys.exit(1)
+        print("OK")
+    finally:
+        if not args.keep and args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
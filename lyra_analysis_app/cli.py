@@ -0,0 +1,272 @@
+
+'''
+Command-line entry point.
+
+    python -m lyra_analysis_app ingest PATH [--db lyra_transcripts.db] [--workers 4] [--incremental]
+    python -m lyra_analysis_app report [--db lyra_transcripts.db] [--out reports/] [--format json csv html]
+    python -m lyra_analysis_app serve [--db lyra_transcripts.db] [--port 8765 | --unix-socket PATH]
+    python -m lyra_analysis_app ingest PATH --db shard0.db --shard hash:0/4
+    python -m lyra_analysis_app merge lyra_transcripts.db shard0.db shard1.db ...
+    python -m lyra_analysis_app watch PATH [--db lyra_transcripts.db] [--interval 1] [--settle 2]
+'''
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from .ingest_transcripts_sqlite import (
+    DB_PATH,
+    SAMPLE_RATE,
+    FilterRules,
+    IngestOptions,
+    ShardSpec,
+    ensure_tokenizer_data,
+    get_meta,
+    ingest_data,
+    metrics_path_for,
+)
+from .watch import MAX_BATCH_FILES, POLL_INTERVAL, SETTLE_SECONDS, watch
+
+
+def _require_tokenizer():
+    """Tokenizing commands need NLTK's punkt_tab; fail up front instead of mid-ingest."""
+    try:
+        ensure_tokenizer_data()
+    except LookupError as error:
+        sys.exit(str(error))
+
+
+def _ingest(args):
+    _require_tokenizer()
+    filter_rules = None
+    if args.filter_rules:
+        with open(args.filter_rules) as f:
+            filter_rules = FilterRules.from_json(f.read())
+    report = ingest_data(args.path, args.db, IngestOptions(
+        incremental=args.incremental,
+        chunk_size=args.chunk_size,
+        memory_budget=args.memory_budget_mb * 1024 * 1024 if args.memory_budget_mb else None,
+        workers=args.workers,
+        phrase_mode=args.phrase_mode,
+        text_compression=args.text_compression,
+        filter_rules=filter_rules,
+        shard=ShardSpec(args.shard) if args.shard else None,
+        sample_rate=args.sample_rate,
+        count_duplicates=args.count_duplicates,
+        profile=args.profile,
+        metrics_path=args.metrics or metrics_path_for(args.db)
+    ))
+    print(json.dumps({key: value for key, value in report.items() if key != 'profile'}, indent=2, default=str))
+    if report.get('profile'):
+        print(report['profile'])
+
+
+def _report(args):
+    from .report import build_report, write_report_csv, write_report_html, write_report_json
+
+    if args.shards:
+        from .shards import connect_shards
+        conn = connect_shards(args.shards)
+    elif not os.path.exists(args.db):
+        sys.exit(f"Database not found: {args.db}")
+    else:
+        conn = sqlite3.connect(args.db)
+    if get_meta(conn.cursor(), 'phrase_mode', 'eager') == 'lazy':
+        # Lazy phrase mode tokenizes at query time.
+        _require_tokenizer()
+
+    os.makedirs(args.out, exist_ok=True)
+    with conn:
+        cursor = conn.cursor()
+        report = build_report(
+            conn,
+            cursor,
+            limit=args.limit,
+            percentile=args.percentile,
+            per_user=args.per_user
+        )
+    conn.close()
+
+    for fmt in args.format:
+        if fmt == "json":
+            path = os.path.join(args.out, "report.json")
+            write_report_json(report, path)
+        elif fmt == "csv":
+            path = args.out
+            write_report_csv(report, path)
+        else:
+            path = os.path.join(args.out, "report.html")
+            write_report_html(report, path)
+        print(f"Wrote {fmt} report to {path}")
+
+
+def _merge(args):
+    from .shards import merge_shards
+
+    print(json.dumps(merge_shards(args.shards, args.out), indent=2))
+
+
+def _watch(args):
+    if not os.path.isdir(args.path):
+        sys.exit(f"Folder not found: {args.path}")
+    _require_tokenizer()
+    filter_rules = None
+    if args.filter_rules:
+        with open(args.filter_rules) as f:
+            filter_rules = FilterRules.from_json(f.read())
+    print(f"Watching {args.path} for new transcripts (Ctrl-C to stop)", flush=True)
+    try:
+        for batch in watch(
+            args.path,
+            db_path=args.db,
+            poll_interval=args.interval,
+            settle_seconds=args.settle,
+            max_batch_files=args.max_batch,
+            options=IngestOptions(
+                workers=args.workers,
+                phrase_mode=args.phrase_mode,
+                text_compression=args.text_compression,
+                filter_rules=filter_rules,
+                sample_rate=args.sample_rate,
+                count_duplicates=args.count_duplicates
+            )
+        ):
+            if 'error' in batch:
+                error = batch['error']
+                print(
+                    f"{time.strftime('%H:%M:%S')} failed to ingest {len(batch['files'])} files "
+                    f"({', '.join(batch['files'][:3])}{', ...' if len(batch['files']) > 3 else ''}): "
+                    f"{type(error).__name__}: {error}",
+                    file=sys.stderr,
+                    flush=True
+                )
+                if batch['given_up']:
+                    print(f"  giving up on {', '.join(batch['given_up'])}", file=sys.stderr, flush=True)
+                continue
+            report = batch['report']
+            counters = report['counters']
+            print(
+                f"{time.strftime('%H:%M:%S')} ingested {counters.get('files', 0)} of {len(batch['files'])} files, "
+                f"{counters.get('messages', 0)} messages in {report['timings_s'].get('total', 0):.2f}s "
+                f"(waited up to {batch['latency_s']:.1f}s)",
+                flush=True
+            )
+    except KeyboardInterrupt:
+        pass
+
+
+def _serve(args):
+    import asyncio
+    from .query_service import serve
+
+    if not os.path.exists(args.db):
+        sys.exit(f"Database not found: {args.db}")
+    conn = sqlite3.connect(args.db)
+    lazy = get_meta(conn.cursor(), 'phrase_mode', 'eager') == 'lazy'
+    conn.close()
+    if lazy:
+        _require_tokenizer()
+    try:
+        asyncio.run(serve(
+            args.db,
+            host=args.host,
+            port=args.port,
+            unix_socket=args.unix_socket,
+            pool_size=args.pool_size,
+            cache_size=args.cache_size
+        ))
+    except KeyboardInterrupt:
+        pass
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="lyra_analysis_app", description="Lyra transcript analysis")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest = subparsers.add_parser("ingest", help="parse a folder of .txt transcripts into the database")
+    ingest.add_argument("path", help="folder containing .txt transcripts")
+    ingest.add_argument("--db", default=DB_PATH, help=f"SQLite database to write (default: {DB_PATH})")
+    ingest.add_argument("--workers", type=int, default=1, help="parse/tokenize in this many processes")
+    ingest.add_argument("--incremental", action="store_true",
+                        help="keep existing data and only ingest files not already in the database")
+    ingest.add_argument("--chunk-size", type=int, default=None,
+                        help="commit every N transcripts (enables memory-bounded mode)")
+    ingest.add_argument("--memory-budget-mb", type=int, default=None,
+                        help="phrase buffer / cache budget (enables memory-bounded mode)")
+    ingest.add_argument("--count-duplicates", action="store_true",
+                        help="store and count transcripts with identical content separately")
+    ingest.add_argument("--phrase-mode", choices=["eager", "lazy"], default=None,
+                        help="lazy skips tokenization at ingest and computes phrase stats on first request")
+    ingest.add_argument("--shard", default=None, metavar="SPEC",
+                        help="only ingest this shard: 'hash:I/N' (content hash mod N) or 'date:YYYYMMDD-YYYYMMDD'")
+    ingest.add_argument("--filter-rules", default=None, metavar="JSON",
+                        help="filter/transform rules file, e.g. {\"exclude_tags\": [\"[Lyra Raw History]\"], "
+                             "\"lowercase\": true, \"strip_punctuation\": true, \"stopwords\": [\"the\"]}")
+    ingest.add_argument("--text-compression", choices=["none", "zlib", "zstd"], default=None,
+                        help="store message text compressed with a trained dictionary (zstd needs zstandard)")
+    ingest.add_argument("--sample-rate", type=float, default=SAMPLE_RATE,
+                        help=f"fraction of messages kept for sampling-mode queries, 0 disables (default: {SAMPLE_RATE})")
+    ingest.add_argument("--profile", action="store_true", help="run the ingest under cProfile")
+    ingest.add_argument("--metrics", default=None,
+                        help=f"metrics report path (default: next to the database, {metrics_path_for(DB_PATH)})")
+    ingest.set_defaults(func=_ingest)
+
+    report = subparsers.add_parser("report", help="run every panel query and write a batch report")
+    report.add_argument("--db", default=DB_PATH, help=f"SQLite database to read (default: {DB_PATH})")
+    report.add_argument("--out", default="reports", help="output directory (default: reports)")
+    report.add_argument("--format", nargs="+", choices=["json", "csv", "html"], default=["json"])
+    report.add_argument("--limit", type=int, default=50, help="top-N words and bigrams per speaker")
+    report.add_argument("--percentile", type=float, default=0.95, help="longest-message percentile")
+    report.add_argument("--per-user", action="store_true", help="add a section for every named user")
+    report.add_argument("--shards", nargs="+", default=None, metavar="DB",
+                        help="fan the queries out across these shard databases instead of --db")
+    report.set_defaults(func=_report)
+
+    merge = subparsers.add_parser("merge", help="combine shard databases into one database")
+    merge.add_argument("out", help="merged database to write (replaced if it exists)")
+    merge.add_argument("shards", nargs="+", help="shard databases written with ingest --shard")
+    merge.set_defaults(func=_merge)
+
+    watch = subparsers.add_parser("watch", help="keep ingesting new .txt transcripts as they arrive in a folder")
+    watch.add_argument("path", help="folder to watch")
+    watch.add_argument("--db", default=DB_PATH, help=f"SQLite database to append to (default: {DB_PATH})")
+    watch.add_argument("--interval", type=float, default=POLL_INTERVAL,
+                       help=f"seconds between folder scans (default: {POLL_INTERVAL})")
+    watch.add_argument("--settle", type=float, default=SETTLE_SECONDS,
+                       help=f"seconds a new file must stay unchanged before it is read (default: {SETTLE_SECONDS})")
+    watch.add_argument("--max-batch", type=int, default=MAX_BATCH_FILES,
+                       help=f"transcripts per committed batch (default: {MAX_BATCH_FILES})")
+    watch.add_argument("--workers", type=int, default=1, help="parse/tokenize in this many processes")
+    watch.add_argument("--count-duplicates", action="store_true",
+                       help="store and count transcripts with identical content separately")
+    watch.add_argument("--phrase-mode", choices=["eager", "lazy"], default=None,
+                       help="phrase mode for a new database (an existing one keeps its mode)")
+    watch.add_argument("--filter-rules", default=None, metavar="JSON", help="filter/transform rules file (see ingest)")
+    watch.add_argument("--text-compression", choices=["none", "zlib", "zstd"], default=None,
+                       help="text codec for a new database (an existing one keeps its codec)")
+    watch.add_argument("--sample-rate", type=float, default=SAMPLE_RATE,
+                       help=f"fraction of messages kept for sampling-mode queries (default: {SAMPLE_RATE})")
+    watch.set_defaults(func=_watch)
+
+    serve = subparsers.add_parser("serve", help="serve the dashboard queries over HTTP from a read-only pool")
+    serve.add_argument("--db", default=DB_PATH, help=f"SQLite database to read (default: {DB_PATH})")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--unix-socket", default=None, help="listen on this Unix socket instead of TCP")
+    serve.add_argument("--pool-size", type=int, default=4, help="read-only connections / worker threads")
+    serve.add_argument("--cache-size", type=int, default=256, help="cached results (0 disables the cache)")
+    serve.set_defaults(func=_serve)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
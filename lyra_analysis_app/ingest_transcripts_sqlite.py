@@ -1,14 +1,129 @@
 
-from collections import Counter
+from collections import Counter, OrderedDict, defaultdict, deque
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
 from datetime import datetime
+from itertools import repeat
+import cProfile
+import hashlib
+import io
+import json
+import multiprocessing
 import nltk
 import os
+import pstats
 import re
+import string
 import sqlite3
+import sys
+import time
+import zlib
 import pandas as pd
 from tqdm import tqdm
+from typing import List, Optional
 import warnings
 
+try:
+    import zstandard
+except ImportError:  # optional, only needed for text_compression='zstd'
+    zstandard = None
+
+RAW_HISTORY_TAG = '[Lyra Raw History]'
+
+DB_PATH = "lyra_transcripts.db"
+
+# Sampling mode: fraction of each (speaker_type, day) stratum kept in
+# `message_sample`, with at least SAMPLE_MIN_PER_STRATUM rows per stratum.
+SAMPLE_RATE = 0.05
+SAMPLE_MIN_PER_STRATUM = 50
+
+# Compressed text storage: codecs, shared dictionary size per codec (zlib
+# only uses the last 32 KiB of a preset dictionary) and how many
+# transcripts from the start of the corpus the dictionary is trained on.
+TEXT_CODECS = ('none', 'zlib', 'zstd')
+TEXT_DICTIONARY_BYTES = {'zlib': 32 * 1024, 'zstd': 112 * 1024}
+TEXT_DICTIONARY_SAMPLE_FILES = 200
+
+# Rough per-row overhead (tuple + str headers) used to estimate buffered bytes.
+ROW_OVERHEAD_BYTES = 200
+
+
+class IngestMetrics:
+    """
+    Per-stage wall-clock timers and counters for one ingest run.
+
+    Stages: 'read' (file I/O), 'split' (re.split into messages),
+    'tokenize' (get_phrases_from_message), 'build' (dict / row construction),
+    'insert' (database writes), 'train' (compression dictionary),
+    'refilter' (applying a filter rule change),
+    'sample' (rebuilding `message_sample`),
+    'cache' (extending lazy phrase statistics after an incremental ingest).
+    """
+
+    def __init__(self):
+        self.timings = defaultdict(float)
+        self.counters = Counter()
+        self.profile = None
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - start
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] += n
+
+    def merge(self, other: "IngestMetrics"):
+        """Adds another run's timings and counters (e.g. from a parse worker) into this one."""
+        for name, seconds in other.timings.items():
+            self.timings[name] += seconds
+        self.counters.update(other.counters)
+
+    def report(self):
+        """Returns the metrics as a JSON-serialisable dict."""
+        total = self.timings.get('total') or sum(self.timings.values())
+        rates = {}
+        if total:
+            for name in ('bytes_read', 'messages', 'tokens', 'rows_inserted'):
+                rates[f'{name}_per_s'] = self.counters[name] / total
+        return {
+            'timings_s': dict(self.timings),
+            'counters': dict(self.counters),
+            'throughput': rates,
+            'profile': self.profile
+        }
+
+    def write(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2, default=str)
+
+
+def metrics_path_for(db_path: str):
+    """Where the CLI writes an ingest's metrics report: next to the database."""
+    return os.path.splitext(db_path)[0] + ".metrics.json"
+
+
+def _stage(metrics: Optional[IngestMetrics], name: str):
+    return metrics.stage(name) if metrics is not None else nullcontext()
+
+def ensure_tokenizer_data():
+    """
+    Makes sure NLTK's 'punkt_tab' data (needed by `nltk.word_tokenize`) is
+    installed, downloading it if it is missing. Raises LookupError with
+    instructions if it can't be downloaded.
+    """
+    try:
+        nltk.data.find('tokenizers/punkt_tab')
+    except LookupError:
+        if not nltk.download('punkt_tab', quiet=True):
+            raise LookupError(
+                "NLTK data 'punkt_tab' is missing and could not be downloaded; "
+                "install it with `python -m nltk.downloader punkt_tab` (or set NLTK_DATA)"
+            )
+
 def get_phrases_from_message(message: str):
     words = nltk.word_tokenize(message)
     bigrm = nltk.bigrams(words)
@@ -16,7 +131,376 @@ def get_phrases_from_message(message: str):
     bigrams = [{'text': f'{text[0]} {text[1]}', 'num_words': 2} for text in bigrm]
     return words + bigrams
 
-def read_file(file_path: str):
+def hash_text(text: str):
+    """Content hash used to detect repeated transcripts and messages."""
+    return hashlib.blake2b(text.encode("utf-8", errors="replace"), digest_size=16).hexdigest()
+
+
+# Punctuation stripping: apostrophes are dropped ("don't" -> "dont"),
+# everything else becomes a word break.
+_PUNCTUATION_TABLE = str.maketrans({char: ("" if char == "'" else " ") for char in string.punctuation})
+
+
+class FilterRules:
+    """
+    Declarative filter / transform pipeline applied to messages at ingest.
+
+    - exclude_tags: messages with these tags are dropped before they are
+      tokenized or stored (only a per-transcript count is kept in `excluded_tags`)
+    - lowercase, strip_punctuation: text normalization before tokenization
+    - stopwords: words left out of phrase statistics, along with any
+      bigram containing one
+
+    Stored message text and word counts are left as written; the transforms
+    only shape phrase statistics. The active rule set is versioned in the
+    `filter_rules` table as canonical JSON (see `save_filter_rules`).
+    """
+
+    FIELDS = ('exclude_tags', 'lowercase', 'strip_punctuation', 'stopwords')
+
+    def __init__(
+        self,
+        exclude_tags=(RAW_HISTORY_TAG,),
+        lowercase: bool = False,
+        strip_punctuation: bool = False,
+        stopwords=()
+    ):
+        self.exclude_tags = frozenset(exclude_tags)
+        self.lowercase = bool(lowercase)
+        self.strip_punctuation = bool(strip_punctuation)
+        self.stopwords = frozenset(word.lower() if lowercase else word for word in stopwords)
+
+    @classmethod
+    def from_dict(cls, rules: dict):
+        unknown = set(rules).difference(cls.FIELDS)
+        if unknown:
+            raise ValueError(f"unknown filter rule(s): {', '.join(sorted(unknown))}")
+        return cls(**rules)
+
+    @classmethod
+    def from_json(cls, text: str):
+        return cls.from_dict(json.loads(text))
+
+    def to_dict(self):
+        return {
+            'exclude_tags': sorted(self.exclude_tags),
+            'lowercase': self.lowercase,
+            'strip_punctuation': self.strip_punctuation,
+            'stopwords': sorted(self.stopwords)
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), sort_keys=True)
+
+    def __eq__(self, other):
+        return isinstance(other, FilterRules) and self.to_dict() == other.to_dict()
+
+    def text_rules(self):
+        """The rules that change phrase statistics without changing which messages are stored."""
+        return (self.lowercase, self.strip_punctuation, self.stopwords)
+
+    def keeps(self, tag: str):
+        return tag not in self.exclude_tags
+
+    def normalize(self, text: str):
+        if self.lowercase:
+            text = text.lower()
+        if self.strip_punctuation:
+            text = text.translate(_PUNCTUATION_TABLE)
+        return text
+
+    def phrases(self, text: str):
+        """`get_phrases_from_message` on the normalized text, without stopwords."""
+        phrases = get_phrases_from_message(self.normalize(text))
+        if not self.stopwords:
+            return phrases
+        return [
+            phrase for phrase in phrases
+            if not self.stopwords.intersection(phrase['text'].split(' '))
+        ]
+
+
+class TokenCache:
+    """
+    LRU cache of tokenization results keyed by message text hash, so
+    identical messages (e.g. repeated '[Lyra Raw History]' blocks) are
+    tokenized only once per ingest run.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: Optional[int] = None, tokenizer=get_phrases_from_message):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.tokenizer = tokenizer
+        self.nbytes = 0
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def _size(cached):
+        return sum(len(text) + ROW_OVERHEAD_BYTES for text, _ in cached)
+
+    def get_phrases(self, text: str, text_hash: str, metrics: Optional[IngestMetrics] = None):
+        """
+        Returns fresh phrase dicts for `text`, as the cache's `tokenizer`
+        (by default `get_phrases_from_message`) would.
+        """
+        cached = self._entries.get(text_hash)
+        if cached is not None:
+            self._entries.move_to_end(text_hash)
+            if metrics is not None:
+                metrics.count('token_cache_hits')
+                metrics.count('phrases_reused', len(cached))
+        else:
+            with _stage(metrics, 'tokenize'):
+                phrases = self.tokenizer(text)
+            cached = [(phrase['text'], phrase['num_words']) for phrase in phrases]
+            self._entries[text_hash] = cached
+            self.nbytes += self._size(cached)
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or (self.max_bytes is not None and self.nbytes > self.max_bytes)
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= self._size(evicted)
+            if metrics is not None:
+                metrics.count('token_cache_misses')
+        return [{'text': text, 'num_words': num_words} for text, num_words in cached]
+
+
+class TextCodec:
+    """
+    Compresses message text with zlib or zstd, optionally with a shared
+    dictionary trained on the corpus (see `train`). Texts that would not
+    shrink are kept as plain str, so `decode` accepts both str and bytes.
+    """
+
+    def __init__(self, codec: str, dictionary: bytes = b""):
+        if codec not in ('zlib', 'zstd'):
+            raise ValueError(f"text codec must be 'zlib' or 'zstd', not {codec!r}")
+        if codec == 'zstd' and zstandard is None:
+            raise ValueError("text_compression='zstd' requires the zstandard package")
+        self.codec = codec
+        self.dictionary = dictionary or b""
+        if codec == 'zlib':
+            # Loading a preset dictionary costs about as much as compressing
+            # it, so prime one (de)compressor and copy it per message.
+            zdict = {'zdict': self.dictionary} if self.dictionary else {}
+            self._compressor = zlib.compressobj(6, **zdict)
+            self._decompressor = zlib.decompressobj(**zdict)
+        else:
+            dict_data = zstandard.ZstdCompressionDict(self.dictionary) if self.dictionary else None
+            self._compressor = zstandard.ZstdCompressor(level=9, dict_data=dict_data)
+            self._decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+
+    @classmethod
+    def train(cls, codec: str, texts):
+        """
+        Builds a codec whose dictionary is trained on `texts`.
+
+        zstd uses its own dictionary trainer. For zlib the most frequent
+        texts are packed into the preset dictionary, most frequent last
+        since zlib matches nearer the end of the window more cheaply.
+        """
+        size = TEXT_DICTIONARY_BYTES[codec]
+        texts = [text for text in texts if text]
+        dictionary = b""
+        if codec == 'zstd' and zstandard is not None:
+            try:
+                dictionary = zstandard.train_dictionary(size, [text.encode() for text in texts]).as_bytes()
+            except zstandard.ZstdError:
+                dictionary = b""  # too few samples to train on
+        elif codec == 'zlib':
+            chunks = []
+            remaining = size
+            for text, _ in Counter(texts).most_common():
+                if remaining <= 0:
+                    break
+                data = text.encode()[-remaining:]
+                chunks.append(data)
+                remaining -= len(data)
+            dictionary = b"".join(reversed(chunks))
+        return cls(codec, dictionary)
+
+    def encode(self, text: str):
+        data = text.encode()
+        if self.codec == 'zlib':
+            compressor = self._compressor.copy()
+            packed = compressor.compress(data) + compressor.flush()
+        else:
+            packed = self._compressor.compress(data)
+        return packed if len(packed) < len(data) else text
+
+    def decode(self, value):
+        if not isinstance(value, bytes):
+            return value
+        if self.codec == 'zlib':
+            decompressor = self._decompressor.copy()
+            return (decompressor.decompress(value) + decompressor.flush()).decode()
+        return self._decompressor.decompress(value).decode()
+
+
+def load_text_codec(cursor):
+    """Returns the database's TextCodec, or None if message text is stored uncompressed."""
+    codec = get_meta(cursor, 'text_compression', 'none')
+    if codec == 'none':
+        return None
+    cursor.execute("SELECT dictionary FROM text_dictionary WHERE codec = ?", (codec,))
+    row = cursor.fetchone()
+    return TextCodec(codec, row[0] if row is not None else b"")
+
+def save_text_codec(cursor, codec: Optional[TextCodec]):
+    cursor.execute("DELETE FROM text_dictionary")
+    if codec is not None:
+        cursor.execute(
+            "INSERT INTO text_dictionary (codec, dictionary) VALUES (?, ?)",
+            (codec.codec, codec.dictionary)
+        )
+    set_meta(cursor, 'text_compression', codec.codec if codec is not None else 'none')
+
+def text_decoder(cursor):
+    """Returns a function mapping stored `messages.text` values back to str."""
+    codec = load_text_codec(cursor)
+    return codec.decode if codec is not None else (lambda value: value)
+
+
+class ShardSpec:
+    """
+    Selects the transcripts one shard of a distributed ingest is responsible for.
+
+    - 'hash:I/N': transcripts whose content hash mod N is I. Copies of a
+      transcript share a hash, so deduplication works the same as on one host.
+    - 'date:FROM-TO': transcripts whose filename timestamp falls on a day
+      in [FROM, TO] (YYYYMMDD, inclusive). Files without a timestamp match
+      no date shard.
+    """
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        kind, _, value = spec.partition(':')
+        if kind == 'hash':
+            match = re.fullmatch(r"(\d+)/(\d+)", value)
+            if not match or not 0 <= int(match.group(1)) < int(match.group(2)):
+                raise ValueError(f"hash shard spec must look like 'hash:I/N' with 0 <= I < N, not {spec!r}")
+            self.kind, self.index, self.count = kind, int(match.group(1)), int(match.group(2))
+        elif kind == 'date':
+            match = re.fullmatch(r"(\d{8})-(\d{8})", value)
+            if not match:
+                raise ValueError(f"date shard spec must look like 'date:YYYYMMDD-YYYYMMDD', not {spec!r}")
+            self.kind = kind
+            self.first_day = datetime.strptime(match.group(1), "%Y%m%d").date()
+            self.last_day = datetime.strptime(match.group(2), "%Y%m%d").date()
+        else:
+            raise ValueError(f"shard spec must start with 'hash:' or 'date:', not {spec!r}")
+
+    def __str__(self):
+        return self.spec
+
+    def selects_path(self, file_path: str):
+        """Date shards decide from the file name alone; hash shards need `selects_hash`."""
+        if self.kind != 'date':
+            return True
+        match = re.search(r"(\d{8})-\d{6}", os.path.basename(file_path))
+        if not match:
+            return False
+        day = datetime.strptime(match.group(1), "%Y%m%d").date()
+        return self.first_day <= day <= self.last_day
+
+    def selects_hash(self, content_hash: str):
+        return self.kind != 'hash' or int(content_hash, 16) % self.count == self.index
+
+
+def parse_tag(tag: str):
+    """
+    Splits a message tag into a role and an optional speaker name.
+
+    '[STT: Alice]' -> ('STT', 'Alice'), '[LLM]' -> ('LLM', None)
+    """
+    inner = tag.strip()
+    if inner.startswith('[') and inner.endswith(']'):
+        inner = inner[1:-1]
+    match = re.match(r"^(?P<role>[^:|]+?)\s*[:|]\s*(?P<name>.+)$", inner)
+    if match:
+        return match.group('role').strip(), match.group('name').strip()
+    return inner.strip(), None
+
+# Tag -> (role, name, speaker_type). The set of distinct tags is tiny
+# compared to the number of messages, so each is classified only once.
+_tag_lookup = {}
+
+MESSAGE_COLUMNS = ('tag', 'role', 'name', 'speaker_type', 'position', 'text', 'text_hash', 'word_count')
+
+def classify_tag(tag: str):
+    """
+    Returns (role, name, speaker_type) for a message tag. The speaker type
+    comes from the whole tag, as before names were parsed out of it.
+    """
+    role, name = parse_tag(tag)
+    return role, name, get_speaker_type(tag)
+
+def message_columns(tags, texts, positions=None, text_hashes=None):
+    """
+    Batch message-processing stage: classifies and measures a whole
+    transcript's messages (or a batch spanning several transcripts) at once.
+
+    Returns a dict of equal-length lists keyed by MESSAGE_COLUMNS, which
+    `write_to_db` zips straight into its insert rows.
+    """
+    for tag in set(tags).difference(_tag_lookup):
+        _tag_lookup[tag] = classify_tag(tag)
+    classified = list(map(_tag_lookup.__getitem__, tags))
+
+    return {
+        'tag': list(tags),
+        'role': [role for role, _, _ in classified],
+        'name': [name for _, name, _ in classified],
+        'speaker_type': [speaker_type for _, _, speaker_type in classified],
+        'position': list(positions) if positions is not None else list(range(len(tags))),
+        'text': list(texts),
+        'text_hash': list(text_hashes) if text_hashes is not None else list(map(hash_text, texts)),
+        'word_count': list(map(len, map(str.split, texts)))
+    }
+
+def process_messages(messages):
+    """Converts a list of message dicts ({"tag", "text", "position", ...}) to `message_columns` form."""
+    return message_columns(
+        [msg["tag"] for msg in messages],
+        [msg["text"] for msg in messages],
+        [msg.get("position", i) for i, msg in enumerate(messages)],
+        [msg.get("text_hash") or hash_text(msg["text"]) for msg in messages]
+    )
+
+def read_transcript_text(file_path: str, metrics: Optional[IngestMetrics] = None):
+    """
+    Reads a transcript and returns (text, content_hash).
+    The hash is over the decoded text so copies under different names match.
+    """
+    with _stage(metrics, 'read'):
+        with open(file_path, encoding="utf-8", errors="replace") as f:
+            text = f.read()
+    if metrics is not None:
+        metrics.count('bytes_read', os.path.getsize(file_path))
+    return text, hash_text(text)
+
+def read_file(
+    file_path: str,
+    metrics: Optional[IngestMetrics] = None,
+    token_cache: Optional[TokenCache] = None,
+    text: Optional[str] = None,
+    tokenize: bool = True,
+    rules: Optional[FilterRules] = None
+):
+    """
+    Parses a transcript into (transcript, messages, phrases), where
+    `messages` is the columnar batch returned by `message_columns`.
+
+    `text` may be passed when the file has already been read
+    (see `read_transcript_text`). With a `token_cache`, messages whose
+    text hash has been seen before reuse the cached tokenization.
+    With `tokenize` False (lazy phrase mode) every phrase list is empty.
+
+    With `rules`, messages whose tag is excluded are dropped (counted per
+    tag in transcript['excluded_tags']) and phrases come from
+    `rules.phrases`; the `token_cache` must use the same tokenizer.
+    """
 
     match = re.search(r"(\d{8}-\d{6})", file_path)
     dt = None
@@ -30,44 +514,65 @@ def read_file(file_path: str):
     }
 
     # Parse Messages from transcript.
-    messages = []
+    tags = []
+    texts = []
+    positions = []
     all_phrases = []
+    excluded_tags = Counter()
+    tokenizer = rules.phrases if rules is not None else get_phrases_from_message
 
-    n_lines_successfully_processed = 0
-    total_lines_processed = 0
+    if text is None:
+        text, content_hash = read_transcript_text(file_path, metrics)
+    else:
+        content_hash = hash_text(text)
+    transcript['content_hash'] = content_hash
 
-    with open(file_path, encoding="utf-8", errors="replace") as f:
-        text = f.read()
+    with _stage(metrics, 'split'):
         parts = re.split(r"(\n\[[^\]]+\])", text)
 
-        # Recombine: each chunk = marker + following text
-        chunks = []
+    # Recombine: each chunk = marker + following text
+    with _stage(metrics, 'build'):
         for i in range(1, len(parts), 2):  # markers are odd indices, content is even
             marker = parts[i].strip()  # e.g. "[123]"
-            content = parts[i+1].strip() if i+1 < len(parts) else ""
-            message_data = {
-                'tag': marker,
-                'text': content
-            }
+            if rules is not None and not rules.keeps(marker):
+                excluded_tags[marker] += 1
+                continue
+            tags.append(marker)
+            texts.append(parts[i+1].strip() if i+1 < len(parts) else "")
+            positions.append(i // 2)
+        messages = message_columns(tags, texts, positions)
+    transcript['excluded_tags'] = excluded_tags
 
-            line_number = i // 2
+    for line_number, content, text_hash in zip(positions, texts, messages['text_hash']):
+        if not tokenize:
+            all_phrases.append([])
+            continue
+        if token_cache is not None:
+            phrases = token_cache.get_phrases(content, text_hash, metrics)
+        else:
+            with _stage(metrics, 'tokenize'):
+                phrases = tokenizer(content)
 
-            message_data['position'] = line_number
+        with _stage(metrics, 'build'):
+            for phrase in phrases:
+                phrase['filepath'] = transcript['filepath']
+                phrase['message_id'] = line_number
+        all_phrases.append(phrases)
 
-            if 'text' in message_data:
-                phrases = get_phrases_from_message(message_data["text"])
+    n_lines_successfully_processed = len(tags)
+    total_lines_processed = len(tags) + sum(excluded_tags.values())
 
-                for phrase in phrases:
-                    phrase['filepath'] = transcript['filepath']
-                    phrase['message_id'] = line_number
-                all_phrases.append(phrases)
+    if metrics is not None:
+        metrics.count('files')
+        metrics.count('messages', len(tags))
+        metrics.count('messages_excluded', sum(excluded_tags.values()))
+        metrics.count('phrases', sum(len(phrases) for phrases in all_phrases))
+        metrics.count('tokens', sum(
+            1 for phrases in all_phrases for phrase in phrases if phrase['num_words'] == 1
+        ))
 
-            messages.append(message_data)
-            n_lines_successfully_processed += 1
-            total_lines_processed += 1
 
-
-    transcript['message_count'] = len(messages)
+    transcript['message_count'] = len(tags)
 
     return (transcript, messages, all_phrases), (n_lines_successfully_processed, total_lines_processed)
 
@@ -76,7 +581,16 @@ def delete_tables(conn, cursor):
     commands = [
         "DROP TABLE IF EXISTS transcripts;",
         "DROP TABLE IF EXISTS messages;",
-        "DROP TABLE IF EXISTS phrases;"
+        "DROP TABLE IF EXISTS phrases;",
+        "DROP TABLE IF EXISTS speakers;",
+        "DROP TABLE IF EXISTS turns;",
+        "DROP TABLE IF EXISTS meta;",
+        "DROP TABLE IF EXISTS phrase_cache;",
+        "DROP TABLE IF EXISTS phrase_cache_entries;",
+        "DROP TABLE IF EXISTS message_sample;",
+        "DROP TABLE IF EXISTS text_dictionary;",
+        "DROP TABLE IF EXISTS filter_rules;",
+        "DROP TABLE IF EXISTS excluded_tags;"
 
     ]
 
@@ -90,7 +604,14 @@ def setup_db(conn, cursor):
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             filepath TEXT UNIQUE NOT NULL,
             timestamp TIMESTAMP,
-            message_count INTEGER
+            message_count INTEGER,
+            content_hash TEXT
+        );""",
+        """CREATE TABLE IF NOT EXISTS speakers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            speaker_type TEXT NOT NULL CHECK(speaker_type IN ('lyra', 'user', 'unknown')),
+            name TEXT NOT NULL,
+            UNIQUE (speaker_type, name)
         );""",
         """
         CREATE TABLE IF NOT EXISTS messages (
@@ -98,11 +619,13 @@ def setup_db(conn, cursor):
             transcript_id INTEGER NOT NULL REFERENCES transcripts(id) ON DELETE CASCADE,
             tag TEXT,
             speaker_type TEXT NOT NULL CHECK(speaker_type IN ('lyra', 'user', 'unknown')),
+            speaker_id INTEGER REFERENCES speakers(id),
             position INTEGER,
             previous_message_id INTEGER,
             name TEXT,
             role TEXT,
             text TEXT,
+            text_hash TEXT,
             word_count INTEGER,
             UNIQUE (transcript_id, position)
         );
@@ -112,7 +635,74 @@ def setup_db(conn, cursor):
             num_words INTEGER,
             filepath TEXT,
             message_id INTEGER NOT NULL REFERENCES messages(id)
-        );"""
+        );""",
+        # One row per user message answered by Lyra, precomputed at ingest so
+        # paired user->Lyra analyses are a single indexed lookup.
+        """CREATE TABLE IF NOT EXISTS turns (
+            user_message_id INTEGER PRIMARY KEY REFERENCES messages(id),
+            lyra_message_id INTEGER NOT NULL REFERENCES messages(id),
+            transcript_id INTEGER NOT NULL REFERENCES transcripts(id),
+            user_speaker_id INTEGER REFERENCES speakers(id),
+            user_word_count INTEGER,
+            lyra_word_count INTEGER,
+            turn_gap INTEGER
+        );""",
+        # Ingest-wide settings: 'phrase_mode' ('eager' | 'lazy') and the
+        # 'ingest_generation' counter that invalidates phrase_cache.
+        """CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );""",
+        # Lazy phrase mode: per-combination phrase counts computed on first request.
+        """CREATE TABLE IF NOT EXISTS phrase_cache_entries (
+            cache_key TEXT PRIMARY KEY,
+            generation INTEGER NOT NULL,
+            messages_scanned INTEGER
+        );""",
+        """CREATE TABLE IF NOT EXISTS phrase_cache (
+            cache_key TEXT NOT NULL,
+            generation INTEGER NOT NULL,
+            text TEXT,
+            frequency INTEGER
+        );""",
+        "CREATE INDEX IF NOT EXISTS idx_phrase_cache_key ON phrase_cache (cache_key, generation, frequency DESC);",
+        # Compressed text storage: shared dictionary for the 'text_compression' codec.
+        """CREATE TABLE IF NOT EXISTS text_dictionary (
+            codec TEXT PRIMARY KEY,
+            dictionary BLOB
+        );""",
+        # Versioned FilterRules (the active version is meta 'filter_rules_version')
+        # and per-transcript counts of the messages they excluded.
+        """CREATE TABLE IF NOT EXISTS filter_rules (
+            version INTEGER PRIMARY KEY,
+            rules TEXT NOT NULL,
+            created_at TEXT
+        );""",
+        """CREATE TABLE IF NOT EXISTS excluded_tags (
+            transcript_id INTEGER,
+            tag TEXT,
+            message_count INTEGER
+        );""",
+        "CREATE INDEX IF NOT EXISTS idx_excluded_tags_tag ON excluded_tags (tag, transcript_id);",
+        # Sampling mode: stratified sample of messages, rebuilt by `build_message_sample`.
+        """CREATE TABLE IF NOT EXISTS message_sample (
+            message_id INTEGER PRIMARY KEY,
+            speaker_type TEXT,
+            speaker_id INTEGER,
+            day TEXT,
+            word_count INTEGER,
+            weight REAL NOT NULL
+        );""",
+        "CREATE INDEX IF NOT EXISTS idx_message_sample_speaker_id ON message_sample (speaker_id, word_count, weight);",
+        "CREATE INDEX IF NOT EXISTS idx_message_sample_speaker_type ON message_sample (speaker_type, word_count, weight);",
+        "CREATE INDEX IF NOT EXISTS idx_transcripts_content_hash ON transcripts (content_hash);",
+        # Per-speaker panels filter on speaker_id / speaker_type, so these
+        # indexes cover the percentile and longest-message scans and let the
+        # phrase join walk only the selected speaker's messages.
+        "CREATE INDEX IF NOT EXISTS idx_messages_speaker_id ON messages (speaker_id, word_count);",
+        "CREATE INDEX IF NOT EXISTS idx_messages_speaker_type ON messages (speaker_type, word_count);",
+        "CREATE INDEX IF NOT EXISTS idx_phrases_message ON phrases (message_id, num_words, text);",
+        "CREATE INDEX IF NOT EXISTS idx_turns_speaker ON turns (user_speaker_id, user_word_count, lyra_word_count, turn_gap);"
 
     ]
     for command in commands:
@@ -121,6 +711,19 @@ def setup_db(conn, cursor):
 
 
 
+def get_meta(cursor, key: str, default: Optional[str] = None):
+    """Returns a value from the `meta` table, or `default` if unset (or the table is missing)."""
+    try:
+        cursor.execute("SELECT value FROM meta WHERE key = ?", (key,))
+    except sqlite3.OperationalError:
+        return default
+    row = cursor.fetchone()
+    return row[0] if row is not None else default
+
+def set_meta(cursor, key: str, value):
+    cursor.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+
 def get_word_count(text: str):
     return len(text.split())
 
@@ -135,45 +738,462 @@ def get_speaker_type(tag: str):
         return "unknown"
 
 
-def write_to_db(conn, cursor, transcript, messages, phrases):
+def get_speaker_id(cursor, speaker_type: str, name: str, speaker_ids: Optional[dict] = None):
     """
-    Inserts a transcript, its messages, and phrases into the database.
+    Returns the id of the (speaker_type, name) row in `speakers`, creating it if needed.
 
-    Parameters:
-    - transcript: dict with at least {"filepath": ..., "timestamp": ..., "message_count": ...}
-    - messages: list of dicts, each with keys {"tag", "position", "name", "role", "text"}
-    - phrases: list of lists of dicts, each with keys {"text", "num_words", "filepath"} corresponding to messages
+    `speaker_ids` is an optional in-memory cache so repeated speakers
+    do not hit the database once per message.
     """
+    key = (speaker_type, name)
+    if speaker_ids is not None and key in speaker_ids:
+        return speaker_ids[key]
 
-    # 1️⃣ Insert transcript
     cursor.execute(
-        "INSERT INTO transcripts (filepath, timestamp, message_count) VALUES (?, ?, ?)",
-        (transcript["filepath"], transcript["timestamp"], transcript["message_count"])
+        "INSERT OR IGNORE INTO speakers (speaker_type, name) VALUES (?, ?)",
+        key
+    )
+    cursor.execute(
+        "SELECT id FROM speakers WHERE speaker_type = ? AND name = ?",
+        key
     )
-    transcript_id = cursor.lastrowid  # get the SQLite ID of the inserted transcript
+    speaker_id = cursor.fetchone()[0]
 
-    # 2️⃣ Insert messages and track their IDs
-    message_ids = []
-    for msg in messages:
+    if speaker_ids is not None:
+        speaker_ids[key] = speaker_id
+    return speaker_id
+
+
+def load_filter_rules(cursor):
+    """Returns (version, FilterRules) for the active rule set, or (0, None) if none is stored."""
+    version = int(get_meta(cursor, 'filter_rules_version', 0))
+    if not version:
+        return 0, None
+    cursor.execute("SELECT rules FROM filter_rules WHERE version = ?", (version,))
+    row = cursor.fetchone()
+    return (version, FilterRules.from_json(row[0])) if row is not None else (0, None)
+
+def save_filter_rules(cursor, rules: FilterRules):
+    """Makes `rules` the active rule set, adding a new version if it differs from the current one."""
+    version, current = load_filter_rules(cursor)
+    if current != rules:
+        cursor.execute(
+            "INSERT INTO filter_rules (rules, created_at) VALUES (?, ?)",
+            (rules.to_json(), datetime.now().isoformat(timespec='seconds'))
+        )
+        version = cursor.lastrowid
+        set_meta(cursor, 'filter_rules_version', version)
+    return version
+
+def phrase_tokenizer(cursor):
+    """Returns the phrase tokenizer matching the database's active FilterRules."""
+    _, rules = load_filter_rules(cursor)
+    return rules.phrases if rules is not None else get_phrases_from_message
+
+def count_phrases(texts, num_words: int, tokenizer=get_phrases_from_message):
+    """Counts the phrases of `num_words` words in `texts`."""
+    counts = Counter()
+    for text in texts:
+        counts.update(
+            phrase['text'] for phrase in tokenizer(text) if phrase['num_words'] == num_words
+        )
+    return counts
+
+def phrase_cache_key(speaker_type: Optional[str], speaker_id: Optional[int], num_words: int):
+    """Key of a speaker/num_words combination in `phrase_cache`."""
+    if speaker_id is not None:
+        return f"speaker_id={speaker_id}|num_words={num_words}"
+    return f"speaker_type={speaker_type or '*'}|num_words={num_words}"
+
+def parse_phrase_cache_key(cache_key: str):
+    """Inverse of `phrase_cache_key`: (speaker_type, speaker_id, num_words), or None if malformed."""
+    match = re.fullmatch(r"speaker_(type|id)=(.+)\|num_words=(\d+)", cache_key)
+    if match is None:
+        return None
+    kind, value, num_words = match.groups()
+    if kind == 'id':
+        return None, int(value), int(num_words)
+    return (None if value == '*' else value), None, int(num_words)
+
+def extend_phrase_caches(conn, cursor, after_message_id: int, generation: int):
+    """
+    Carries every current-generation `phrase_cache` entry over to `generation`,
+    adding the phrases of the messages with id > `after_message_id`, so an
+    ingest that only appended messages keeps the lazy phrase statistics
+    instead of recomputing them on the next request. Only the new messages
+    are tokenized. Rows of the old generation are left for the caller to delete.
+
+    Returns the number of entries carried over.
+    """
+    current = int(get_meta(cursor, 'ingest_generation', 0))
+    cursor.execute(
+        "SELECT cache_key, messages_scanned FROM phrase_cache_entries WHERE generation = ?",
+        (current,)
+    )
+    entries = cursor.fetchall()
+    if not entries:
+        return 0
+
+    decode = text_decoder(cursor)
+    tokenizer = phrase_tokenizer(cursor)
+    cursor.execute("SELECT speaker_type, speaker_id, text FROM messages WHERE id > ?", (after_message_id,))
+    new_messages = [(speaker_type, speaker_id, decode(text)) for speaker_type, speaker_id, text in cursor.fetchall()]
+
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS phrase_cache_delta (text TEXT, frequency INTEGER)")
+    carried = 0
+    for cache_key, scanned in entries:
+        parsed = parse_phrase_cache_key(cache_key)
+        if parsed is None:
+            continue
+        speaker_type, speaker_id, num_words = parsed
+        # Same selection as `_speaker_filter`: speaker_id wins over speaker_type.
+        texts = [
+            text for message_type, message_speaker_id, text in new_messages
+            if (message_speaker_id == speaker_id if speaker_id is not None
+                else speaker_type is None or message_type == speaker_type)
+        ]
+        cursor.execute("DELETE FROM phrase_cache_delta")
+        cursor.executemany(
+            "INSERT INTO phrase_cache_delta (text, frequency) VALUES (?, ?)",
+            count_phrases(texts, num_words, tokenizer).items()
+        )
         cursor.execute(
             """
-            INSERT INTO messages
-            (transcript_id, tag, speaker_type, position, name, role, text, word_count)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO phrase_cache (cache_key, generation, text, frequency)
+            SELECT ?, ?, text, SUM(frequency)
+            FROM (
+                SELECT text, frequency FROM phrase_cache WHERE cache_key = ? AND generation = ?
+                UNION ALL
+                SELECT text, frequency FROM phrase_cache_delta
+            )
+            GROUP BY text
             """,
-            (
-                transcript_id,
-                msg.get("tag"),
-                get_speaker_type(msg.get("tag")),
-                msg.get("position"),
-                msg.get("name"),
-                msg.get("role"),
-                msg.get("text"),
-                get_word_count(msg.get("text"))
+            (cache_key, generation, cache_key, current)
+        )
+        cursor.execute(
+            "INSERT OR REPLACE INTO phrase_cache_entries (cache_key, generation, messages_scanned) VALUES (?, ?, ?)",
+            (cache_key, generation, (scanned or 0) + len(texts))
+        )
+        carried += 1
+    return carried
+
+def delete_transcripts(cursor, transcript_ids):
+    """Deletes transcripts and every row derived from them (speakers are kept)."""
+    params = [(transcript_id,) for transcript_id in transcript_ids]
+    message_ids = "SELECT id FROM messages WHERE transcript_id = ?"
+    cursor.executemany(f"DELETE FROM phrases WHERE message_id IN ({message_ids})", params)
+    cursor.executemany(f"DELETE FROM message_sample WHERE message_id IN ({message_ids})", params)
+    cursor.executemany("DELETE FROM turns WHERE transcript_id = ?", params)
+    cursor.executemany("DELETE FROM messages WHERE transcript_id = ?", params)
+    cursor.executemany("DELETE FROM excluded_tags WHERE transcript_id = ?", params)
+    cursor.executemany("DELETE FROM transcripts WHERE id = ?", params)
+
+def retokenize_phrases(
+    cursor,
+    rules: FilterRules,
+    text_codec: Optional[TextCodec] = None,
+    metrics: Optional[IngestMetrics] = None,
+    batch_size: int = 5000
+):
+    """Rebuilds `phrases` from the stored messages with `rules`, without re-reading any files."""
+    decode = text_codec.decode if text_codec is not None else (lambda value: value)
+    token_cache = TokenCache(tokenizer=rules.phrases)
+    cursor.execute("DELETE FROM phrases")
+    last_id = 0
+    while True:
+        cursor.execute(
+            """
+            SELECT m.id, m.text, m.text_hash, t.filepath
+            FROM messages m JOIN transcripts t ON t.id = m.transcript_id
+            WHERE m.id > ? ORDER BY m.id LIMIT ?
+            """,
+            (last_id, batch_size)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        phrase_rows = [
+            (phrase['text'], phrase['num_words'], filepath, message_id)
+            for message_id, text, text_hash, filepath in rows
+            for phrase in token_cache.get_phrases(decode(text), text_hash, metrics)
+        ]
+        with _stage(metrics, 'insert'):
+            cursor.executemany(
+                "INSERT INTO phrases (text, num_words, filepath, message_id) VALUES (?, ?, ?, ?)",
+                phrase_rows
+            )
+        last_id = rows[-1][0]
+
+def apply_filter_rule_change(
+    cursor,
+    old: FilterRules,
+    new: FilterRules,
+    tokenize: bool = True,
+    text_codec: Optional[TextCodec] = None,
+    metrics: Optional[IngestMetrics] = None
+):
+    """
+    Brings data ingested under `old` rules in line with `new`, touching only
+    what the change affects:
+
+    - transcripts with messages under a newly excluded tag, or with excluded
+      messages under a tag that is no longer excluded, are deleted and their
+      file paths returned so the caller re-parses them;
+    - if only the text rules changed, eager-mode phrases are rebuilt from
+      the stored messages (lazy mode recomputes them on request anyway).
+
+    Transcripts whose file no longer exists are left as they are, with a warning.
+    """
+    affected = set()
+    newly_excluded = sorted(new.exclude_tags - old.exclude_tags)
+    newly_included = sorted(old.exclude_tags - new.exclude_tags)
+    if newly_excluded:
+        cursor.execute(
+            f"SELECT DISTINCT transcript_id FROM messages WHERE tag IN ({', '.join('?' * len(newly_excluded))})",
+            newly_excluded
+        )
+        affected.update(row[0] for row in cursor.fetchall())
+    if newly_included:
+        cursor.execute(
+            f"SELECT DISTINCT transcript_id FROM excluded_tags WHERE tag IN ({', '.join('?' * len(newly_included))})",
+            newly_included
+        )
+        affected.update(row[0] for row in cursor.fetchall())
+
+    reingest = {}
+    for transcript_id in sorted(affected):
+        cursor.execute("SELECT filepath FROM transcripts WHERE id = ?", (transcript_id,))
+        filepath = cursor.fetchone()[0]
+        if os.path.exists(filepath):
+            reingest[transcript_id] = filepath
+        else:
+            warnings.warn(f"{filepath} is missing; it keeps its data from the previous filter rules")
+    delete_transcripts(cursor, reingest)
+    if metrics is not None:
+        metrics.count('transcripts_refiltered', len(reingest))
+
+    if tokenize and old.text_rules() != new.text_rules():
+        with _stage(metrics, 'tokenize'):
+            retokenize_phrases(cursor, new, text_codec, metrics)
+    return list(reingest.values())
+
+
+def build_message_sample(
+    conn,
+    cursor,
+    rate: Optional[float] = SAMPLE_RATE,
+    min_per_stratum: int = SAMPLE_MIN_PER_STRATUM,
+    after_message_id: Optional[int] = None
+):
+    """
+    Rebuilds `message_sample`: a deterministic sample of messages stratified
+    by speaker type and transcript day. Each stratum of n messages keeps
+    max(min_per_stratum, rate * n) of them (all if fewer), chosen by a fixed
+    multiplicative hash of the message id, so the same database always gives
+    the same sample. `weight` is n / kept, the number of messages each
+    sampled row stands for. With `rate` None or 0 the sample is left empty.
+
+    With `after_message_id` (after an ingest that only appended messages with
+    the same `rate`) only the strata containing messages with a larger id
+    are rebuilt; strata are sampled independently, so the result is the
+    same as a full rebuild.
+
+    Returns the number of sampled messages.
+    """
+    source = "messages m\n                JOIN transcripts t ON t.id = m.transcript_id"
+    if after_message_id is None or not rate:
+        cursor.execute("DELETE FROM message_sample")
+    else:
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS sample_strata (speaker_type TEXT, day TEXT)")
+        cursor.execute("DELETE FROM sample_strata")
+        cursor.execute(
+            """
+            INSERT INTO sample_strata (speaker_type, day)
+            SELECT DISTINCT m.speaker_type, IFNULL(date(t.timestamp), '')
+            FROM messages m
+            JOIN transcripts t ON t.id = m.transcript_id
+            WHERE m.id > ?
+            """,
+            (after_message_id,)
+        )
+        cursor.execute(
+            """
+            DELETE FROM message_sample WHERE EXISTS (
+                SELECT 1 FROM sample_strata s
+                WHERE s.speaker_type = message_sample.speaker_type AND s.day = IFNULL(message_sample.day, '')
             )
+            """
         )
-        message_ids.append(cursor.lastrowid)
+        # Walk only the transcripts of the touched days, then their messages by
+        # index (CROSS JOIN keeps SQLite from scanning all messages instead).
+        source = """transcripts t
+                CROSS JOIN messages m ON m.transcript_id = t.id
+                WHERE IFNULL(date(t.timestamp), '') IN (SELECT day FROM sample_strata)
+                AND EXISTS (
+                    SELECT 1 FROM sample_strata s
+                    WHERE s.speaker_type = m.speaker_type AND s.day = IFNULL(date(t.timestamp), '')
+                )"""
+    if rate:
+        cursor.execute(
+            f"""
+            INSERT INTO message_sample (message_id, speaker_type, speaker_id, day, word_count, weight)
+            WITH ranked AS (
+                SELECT
+                    m.id, m.speaker_type, m.speaker_id, date(t.timestamp) AS day, m.word_count,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY m.speaker_type, date(t.timestamp)
+                        ORDER BY (m.id * 2654435761) % 4294967296, m.id
+                    ) AS stratum_rank,
+                    COUNT(*) OVER (PARTITION BY m.speaker_type, date(t.timestamp)) AS stratum_size
+                FROM {source}
+            ),
+            sized AS (
+                SELECT *, MIN(stratum_size, MAX(?, CAST(stratum_size * ? + 0.5 AS INTEGER))) AS take
+                FROM ranked
+            )
+            SELECT id, speaker_type, speaker_id, day, word_count, CAST(stratum_size AS REAL) / take
+            FROM sized
+            WHERE stratum_rank <= take
+            """,
+            (min_per_stratum, rate)
+        )
+    set_meta(cursor, 'sample_rate', rate or 0)
+    cursor.execute("SELECT COUNT(*) FROM message_sample")
+    return cursor.fetchone()[0]
+
+
+class PhraseBuffer:
+    """
+    Accumulates phrase rows across transcripts so they can be written in
+    large executemany batches, flushing once their estimated size
+    reaches `budget_bytes`.
+    """
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self.rows = []
+        self.nbytes = 0
+
+    def extend(self, rows):
+        self.rows.extend(rows)
+        self.nbytes += sum(len(row[0]) + len(row[2] or "") + ROW_OVERHEAD_BYTES for row in rows)
+
+    def full(self):
+        return self.nbytes >= self.budget_bytes
 
+    def flush(self, cursor, metrics: Optional[IngestMetrics] = None):
+        if self.rows:
+            with _stage(metrics, 'insert'):
+                cursor.executemany(
+                    """
+                    INSERT INTO phrases (text, num_words, filepath, message_id)
+                    VALUES (?, ?, ?, ?)
+                    """,
+                    self.rows
+                )
+            if metrics is not None:
+                metrics.count('phrase_flushes')
+        self.rows = []
+        self.nbytes = 0
+
+
+def write_to_db(
+    conn,
+    cursor,
+    transcript,
+    messages,
+    phrases,
+    speaker_ids: Optional[dict] = None,
+    metrics: Optional[IngestMetrics] = None,
+    phrase_buffer: Optional[PhraseBuffer] = None,
+    text_codec: Optional[TextCodec] = None
+):
+    """
+    Inserts a transcript, its messages, and phrases into the database.
+
+    Parameters:
+    - transcript: dict with at least {"filepath": ..., "timestamp": ..., "message_count": ...}
+    - messages: columnar batch from `message_columns` (or a list of dicts with
+      keys {"tag", "position", "text"}, which is converted with `process_messages`)
+    - phrases: list of lists of dicts, each with keys {"text", "num_words", "filepath"} corresponding to messages
+    - speaker_ids: optional cache of (speaker_type, name) -> speakers.id shared across calls
+    - metrics: optional IngestMetrics collecting 'build' / 'insert' timings and row counts
+    - phrase_buffer: optional PhraseBuffer; phrase rows are appended to it
+      (and written when the caller flushes it) instead of inserted immediately
+    - text_codec: optional TextCodec; message text is stored compressed
+      (word counts and hashes are still computed from the plain text)
+    """
+
+    # 1️⃣ Insert transcript
+    with _stage(metrics, 'insert'):
+        cursor.execute(
+            "INSERT INTO transcripts (filepath, timestamp, message_count, content_hash) VALUES (?, ?, ?, ?)",
+            (transcript["filepath"], transcript["timestamp"], transcript["message_count"], transcript.get("content_hash"))
+        )
+        transcript_id = cursor.lastrowid  # get the SQLite ID of the inserted transcript
+
+        cursor.executemany(
+            "INSERT INTO excluded_tags (transcript_id, tag, message_count) VALUES (?, ?, ?)",
+            [(transcript_id, tag, count) for tag, count in transcript.get("excluded_tags", {}).items()]
+        )
+
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM messages")
+        next_id = cursor.fetchone()[0] + 1
+
+    # 2️⃣ Insert messages in one bulk write. Ids are assigned up front so each
+    # row can carry its previous_message_id without a second UPDATE pass.
+    build_start = time.perf_counter()
+    if not isinstance(messages, dict):
+        messages = process_messages(messages)
+    tags = messages["tag"]
+    speaker_types = messages["speaker_type"]
+    positions = messages["position"]
+    word_counts = messages["word_count"]
+    n_messages = len(tags)
+
+    message_ids = range(next_id, next_id + n_messages)
+    previous_ids = [None, *message_ids[:-1]]
+    speaker_keys = list(zip(speaker_types, [
+        name or role for name, role in zip(messages["name"], messages["role"])
+    ]))
+    # dict.fromkeys keeps first-seen order so speaker ids are stable across runs.
+    speaker_lookup = {
+        key: get_speaker_id(cursor, key[0], key[1], speaker_ids) for key in dict.fromkeys(speaker_keys)
+    }
+    speaker_id_column = list(map(speaker_lookup.__getitem__, speaker_keys))
+
+    message_rows = list(zip(
+        message_ids,
+        repeat(transcript_id, n_messages),
+        tags,
+        speaker_types,
+        speaker_id_column,
+        positions,
+        previous_ids,
+        messages["name"],
+        messages["role"],
+        list(map(text_codec.encode, messages["text"])) if text_codec is not None else messages["text"],
+        messages["text_hash"],
+        word_counts
+    ))
+
+    # Pair each user message with the next Lyra response before the user speaks again.
+    turn_rows = []
+    pending_user = None  # index of a user message awaiting a Lyra reply
+    for i, speaker_type in enumerate(speaker_types):
+        if speaker_type == "user":
+            pending_user = i
+        elif speaker_type == "lyra" and pending_user is not None and tags[i] != RAW_HISTORY_TAG:
+            turn_rows.append((
+                message_ids[pending_user],
+                message_ids[i],
+                transcript_id,
+                speaker_id_column[pending_user],
+                word_counts[pending_user],
+                word_counts[i],
+                positions[i] - positions[pending_user]
+            ))
+            pending_user = None
 
     # 3️⃣ Map phrases to the correct message IDs
     all_phrases = []
@@ -184,63 +1204,358 @@ def write_to_db(conn, cursor, transcript, messages, phrases):
                 for phrase in phrase_list
             ])
 
-    # 4️⃣ Bulk insert phrases
-    if all_phrases:
-        for phrase in all_phrases:
-            cursor.execute(
+    if metrics is not None:
+        metrics.timings['build'] += time.perf_counter() - build_start
+
+    # 4️⃣ Bulk insert messages, turns and phrases
+    with _stage(metrics, 'insert'):
+        cursor.executemany(
+            """
+            INSERT INTO messages
+            (id, transcript_id, tag, speaker_type, speaker_id, position, previous_message_id, name, role, text, text_hash, word_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            message_rows
+        )
+        cursor.executemany(
+            """
+            INSERT INTO turns
+            (user_message_id, lyra_message_id, transcript_id, user_speaker_id, user_word_count, lyra_word_count, turn_gap)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            turn_rows
+        )
+        if phrase_buffer is not None:
+            phrase_buffer.extend(all_phrases)
+        elif all_phrases:
+            cursor.executemany(
                 """
                 INSERT INTO phrases (text, num_words, filepath, message_id)
                 VALUES (?, ?, ?, ?)
                 """,
-                (phrase[0], phrase[1], phrase[2], phrase[3])
+                all_phrases
             )
 
+    if metrics is not None:
+        metrics.count('rows_inserted', 1 + len(message_rows) + len(turn_rows) + len(all_phrases))
+
     # 5️⃣ Commit all changes at once
     # conn.commit()
 
 
 
-def ingest_data(data_path: str):
+_worker_token_cache = None
+_worker_rules = None
 
-    files = os.listdir(data_path)
-    txt_files = [file for file in files if file.endswith('.txt')]
-    with sqlite3.connect(':memory') as conn:
+def _init_parse_worker(token_cache_max_bytes: Optional[int], rules_json: str):
+    global _worker_token_cache, _worker_rules
+    _worker_rules = FilterRules.from_json(rules_json)
+    _worker_token_cache = TokenCache(max_bytes=token_cache_max_bytes, tokenizer=_worker_rules.phrases)
 
-        cur = conn.cursor()
+def _parse_worker(transcript_path: str, text: str, tokenize: bool = True):
+    """Pool task: parses one already-read transcript, returning its parse and metrics."""
+    metrics = IngestMetrics()
+    parsed, _ = read_file(transcript_path, metrics, _worker_token_cache, text, tokenize, _worker_rules)
+    return parsed, metrics
 
-        # Temporary to get schema correct.
-        delete_tables(conn, cur)
 
-        setup_db(conn, cur)
+@dataclass
+class IngestOptions:
+    """
+    Settings for `ingest_data`. Those left as None keep what the database
+    already has (or the default for a new one).
 
-        for txt_file in tqdm(txt_files):
+    - incremental: keep the existing data and append new transcripts; only
+      the sample strata and lazy phrase caches the new messages touch are
+      updated, and changed `filter_rules` redo just the affected data
+    - chunk_size, memory_budget: memory-bounded ingest straight to disk,
+      committing every `chunk_size` transcripts (default 100) and buffering
+      about `memory_budget` bytes (default 64 MiB)
+    - workers: parse and tokenize in this many processes
+    - phrase_mode: 'eager' fills `phrases`, 'lazy' counts on first request
+    - text_compression: 'none', 'zlib' or 'zstd' for `messages.text`
+    - filter_rules: FilterRules (default: the active ones, else FilterRules())
+    - shard: ShardSpec of the transcripts this shard database holds
+    - sample_rate: `message_sample` rate (see `build_message_sample`);
+      None or 0 skips it
+    - count_duplicates: store transcripts whose content was already ingested
+    - profile, metrics_path, progress: add cProfile output to the report,
+      write the report as JSON, show a tqdm progress bar
+    """
 
-            transcript_path = os.path.join(data_path, txt_file)
+    incremental: bool = False
+    chunk_size: Optional[int] = None
+    memory_budget: Optional[int] = None
+    workers: int = 1
+    phrase_mode: Optional[str] = None
+    text_compression: Optional[str] = None
+    filter_rules: Optional[FilterRules] = None
+    shard: Optional[ShardSpec] = None
+    sample_rate: Optional[float] = SAMPLE_RATE
+    count_duplicates: bool = False
+    profile: bool = False
+    metrics_path: Optional[str] = None
+    progress: bool = True
 
-            (transcript, messages, statistics), (n_lines, total_lines) = read_file(transcript_path)
 
-            write_to_db(conn, cur, transcript, messages, statistics)
+def _dictionary_training_texts(data_path: str, txt_files: List[str], rules: FilterRules, shard: Optional[ShardSpec]):
+    """
+    Message texts of the first TEXT_DICTIONARY_SAMPLE_FILES transcripts the
+    ingest will store, so a shard trains only on (and only reads) its own files.
+    """
+    n_files = 0
+    for txt_file in txt_files:
+        if n_files >= TEXT_DICTIONARY_SAMPLE_FILES:
+            return
+        file_path = os.path.join(data_path, txt_file)
+        if shard is not None and not shard.selects_path(file_path):
+            continue
+        text, content_hash = read_transcript_text(file_path)
+        if shard is not None and not shard.selects_hash(content_hash):
+            continue
+        n_files += 1
+        yield from read_file(file_path, text=text, tokenize=False, rules=rules)[0][1]['text']
+
+
+def ingest_data(
+    data_path: str,
+    db_path: str = DB_PATH,
+    options: Optional[IngestOptions] = None,
+    files: Optional[List[str]] = None
+):
+    """
+    Parses the .txt transcripts in `data_path` (or only the names in `files`)
+    into the database at `db_path`, as set by `options` (see IngestOptions).
+    Returns the IngestMetrics report.
+    """
+    options = options or IngestOptions()
+    # Settings resolved below (defaults, or the values stored in the database).
+    chunk_size, memory_budget = options.chunk_size, options.memory_budget
+    phrase_mode, text_compression = options.phrase_mode, options.text_compression
+    filter_rules = options.filter_rules
+    bounded = chunk_size is not None or memory_budget is not None
+    if bounded:
+        chunk_size = chunk_size or 100
+        memory_budget = memory_budget or 64 * 1024 * 1024
+    in_memory = not (bounded or options.incremental)
+    token_cache_max_bytes = memory_budget // 4 if bounded else None
+
+    metrics = IngestMetrics()
+    profiler = cProfile.Profile() if options.profile else None
+    if profiler is not None:
+        profiler.enable()
+
+    with metrics.stage('total'):
+        if files is None:
+            files = sorted(os.listdir(data_path))
+        txt_files = [file for file in files if file.endswith('.txt')]
+        conn = sqlite3.connect(':memory:' if in_memory else db_path)
+        pool = None
+        try:
+            cur = conn.cursor()
+
+            if bounded:
+                # Keep SQLite's own memory bounded: a page cache of a quarter
+                # of the budget, temp b-trees on disk, WAL so readers are not
+                # blocked between chunk commits.
+                cur.execute(f"PRAGMA cache_size = -{max(memory_budget // 4 // 1024, 2048)};")
+                cur.execute("PRAGMA temp_store = FILE;")
+            if not in_memory:
+                cur.execute("PRAGMA journal_mode = WAL;")
+
+            if not options.incremental:
+                # Temporary to get schema correct.
+                delete_tables(conn, cur)
+
+            setup_db(conn, cur)
+
+            if phrase_mode is None:
+                phrase_mode = get_meta(cur, 'phrase_mode', 'eager')
+            if phrase_mode not in ('eager', 'lazy'):
+                raise ValueError(f"phrase_mode must be 'eager' or 'lazy', not {phrase_mode!r}")
+            tokenize = phrase_mode == 'eager'
+            set_meta(cur, 'phrase_mode', phrase_mode)
+
+            _, stored_rules = load_filter_rules(cur)
+            if stored_rules is None:
+                cur.execute("SELECT 1 FROM messages LIMIT 1")
+                if cur.fetchone() is not None:
+                    # Data from before filter rules were versioned was stored unfiltered.
+                    stored_rules = FilterRules(exclude_tags=())
+            if filter_rules is None:
+                filter_rules = stored_rules or FilterRules()
+
+            stored_compression = get_meta(cur, 'text_compression', 'none')
+            if text_compression is None:
+                text_compression = stored_compression
+            if text_compression not in TEXT_CODECS:
+                raise ValueError(f"text_compression must be one of {TEXT_CODECS}, not {text_compression!r}")
+            if text_compression == stored_compression:
+                text_codec = load_text_codec(cur)
+            else:
+                cur.execute("SELECT 1 FROM messages LIMIT 1")
+                if cur.fetchone() is not None:
+                    raise ValueError(
+                        f"database text is stored with {stored_compression!r}; "
+                        f"re-ingest without incremental to switch to {text_compression!r}"
+                    )
+                text_codec = None
+                if text_compression != 'none':
+                    with metrics.stage('train'):
+                        text_codec = TextCodec.train(
+                            text_compression, _dictionary_training_texts(data_path, txt_files, filter_rules, options.shard)
+                        )
+                save_text_codec(cur, text_codec)
+
+            transcript_paths = [os.path.join(data_path, txt_file) for txt_file in txt_files]
+            # Messages are only appended (ids above this) unless the rules changed.
+            appending = options.incremental and (stored_rules is None or filter_rules == stored_rules)
+            cur.execute("SELECT COALESCE(MAX(id), 0) FROM messages")
+            last_message_id = cur.fetchone()[0]
+            if stored_rules is not None and filter_rules != stored_rules:
+                with metrics.stage('refilter'):
+                    reingest_paths = apply_filter_rule_change(
+                        cur, stored_rules, filter_rules, tokenize, text_codec, metrics
+                    )
+                listed = set(transcript_paths)
+                transcript_paths += [path for path in reingest_paths if path not in listed]
+            save_filter_rules(cur, filter_rules)
+            set_meta(cur, 'count_duplicates', int(options.count_duplicates))
+            if options.shard is not None:
+                set_meta(cur, 'shard', options.shard)
+
+            speaker_ids = {}
+            token_cache = TokenCache(max_bytes=token_cache_max_bytes, tokenizer=filter_rules.phrases)
+            phrase_buffer = PhraseBuffer(memory_budget // 2) if bounded else None
+            pending_transcripts = 0
+            # Hashes of transcripts handed to the pool but not yet written.
+            in_flight_hashes = set()
+            in_flight = deque()
+
+            if options.workers > 1:
+                pool = multiprocessing.Pool(options.workers, _init_parse_worker, (token_cache_max_bytes, filter_rules.to_json()))
+
+            def write(parsed):
+                nonlocal pending_transcripts
+                transcript, messages, statistics = parsed
+                write_to_db(conn, cur, transcript, messages, statistics, speaker_ids, metrics, phrase_buffer, text_codec)
 
-        conn.commit()
+                if bounded:
+                    pending_transcripts += 1
+                    if phrase_buffer.full():
+                        phrase_buffer.flush(cur, metrics)
+                    if pending_transcripts >= chunk_size:
+                        phrase_buffer.flush(cur, metrics)
+                        with metrics.stage('insert'):
+                            conn.commit()
+                        metrics.count('commits')
+                        pending_transcripts = 0
 
-        # 2. Connect to a file database
-        disk_conn = sqlite3.connect("lyra_transcripts.db")
+            def write_next_in_flight():
+                content_hash, result = in_flight.popleft()
+                with metrics.stage('wait'):
+                    parsed, worker_metrics = result.get()
+                metrics.merge(worker_metrics)
+                write(parsed)
+                in_flight_hashes.discard(content_hash)
 
-        # 3. Backup in-memory database to file
-        conn.backup(disk_conn)
+            for transcript_path in tqdm(transcript_paths, disable=not options.progress):
 
-        disk_conn.close()
+                if options.shard is not None and not options.shard.selects_path(transcript_path):
+                    metrics.count('files_other_shards')
+                    continue
+
+                if options.incremental:
+                    cur.execute("SELECT 1 FROM transcripts WHERE filepath = ? LIMIT 1", (transcript_path,))
+                    if cur.fetchone() is not None:
+                        metrics.count('files_already_ingested')
+                        continue
+
+                text, content_hash = read_transcript_text(transcript_path, metrics)
+                if options.shard is not None and not options.shard.selects_hash(content_hash):
+                    metrics.count('files_other_shards')
+                    continue
+
+                cur.execute("SELECT 1 FROM transcripts WHERE content_hash = ? LIMIT 1", (content_hash,))
+                if cur.fetchone() is not None or content_hash in in_flight_hashes:
+                    metrics.count('duplicate_files')
+                    if not options.count_duplicates:
+                        metrics.count('duplicate_files_skipped')
+                        metrics.count('duplicate_bytes_skipped', os.path.getsize(transcript_path))
+                        continue
+
+                if pool is None:
+                    parsed, _ = read_file(transcript_path, metrics, token_cache, text, tokenize, filter_rules)
+                    write(parsed)
+                else:
+                    in_flight_hashes.add(content_hash)
+                    in_flight.append((content_hash, pool.apply_async(_parse_worker, (transcript_path, text, tokenize))))
+                    # Bound the number of parsed transcripts held in memory.
+                    while len(in_flight) >= 2 * options.workers:
+                        write_next_in_flight()
+
+            while in_flight:
+                write_next_in_flight()
+
+            if phrase_buffer is not None:
+                phrase_buffer.flush(cur, metrics)
+
+            previous_rate = get_meta(cur, 'sample_rate')
+            same_rate = previous_rate is not None and float(previous_rate) == (options.sample_rate or 0)
+            with metrics.stage('sample'):
+                metrics.count('sampled_messages', build_message_sample(
+                    conn, cur, options.sample_rate, after_message_id=last_message_id if appending and same_rate else None
+                ))
+
+            generation = int(get_meta(cur, 'ingest_generation', 0)) + 1
+            if appending:
+                with metrics.stage('cache'):
+                    metrics.count('phrase_caches_extended', extend_phrase_caches(conn, cur, last_message_id, generation))
+            set_meta(cur, 'ingest_generation', generation)
+            cur.execute("DELETE FROM phrase_cache WHERE generation < ?", (generation,))
+            cur.execute("DELETE FROM phrase_cache_entries WHERE generation < ?", (generation,))
+
+            with metrics.stage('insert'):
+                conn.commit()
+
+            if in_memory:
+                # 2. Connect to a file database
+                disk_conn = sqlite3.connect(db_path)
+
+                # 3. Backup in-memory database to file
+                with metrics.stage('backup'):
+                    conn.backup(disk_conn)
+
+                # The backup copies the in-memory journal settings; switch the file
+                # to WAL so read-only dashboard/query-service readers never block.
+                disk_conn.execute("PRAGMA journal_mode = WAL;")
+                disk_conn.close()
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+            conn.close()
+
+    if profiler is not None:
+        profiler.disable()
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(25)
+        metrics.profile = stream.getvalue()
+
+    if options.metrics_path is not None:
+        metrics.write(options.metrics_path)
+
+    return metrics.report()
 
 
 
 def main():
-    '''Populates db (assumed already existing)
-    with data from the transcripts located at `data_path`.
+    '''Populates db with data from the transcripts located at the given path.
+    Equivalent to `python -m lyra_analysis_app ingest ...`.
     '''
+    from .cli import main as cli_main
 
-    data_path = "/Users/samrandall/Downloads/TRANSCRIPTS/"
-
-    ingest_data(data_path)
+    cli_main(["ingest"] + sys.argv[1:])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,332 @@
+
+'''
+Local read-only query service.
+
+Serves the query functions from `run_dashboard` over HTTP (TCP or a Unix
+socket) so several dashboard sessions share one pool of read-only WAL
+connections. Identical in-flight requests are coalesced into one query,
+and results are cached until the database changes. The only write is
+lazy phrase counts, which are saved through one writable connection.
+
+    python -m lyra_analysis_app serve --db lyra_transcripts.db --port 8765
+    curl 'http://127.0.0.1:8765/query/phrase_frequencies?speaker_type=user&num_words=1&limit=50'
+
+Point the dashboard at it with LYRA_QUERY_SERVICE=http://127.0.0.1:8765
+(or unix:/path/to/socket).
+'''
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit
+import asyncio
+import http.client
+import json
+import os
+import socket
+import sqlite3
+import threading
+
+from .ingest_transcripts_sqlite import DB_PATH
+from .run_dashboard import (
+    get_ingest_generation,
+    get_messages_above_percentile_sampled,
+    get_messages_above_percentile_sqlite,
+    get_messages_sentence_length_percentiles_sqlite,
+    get_phrase_frequencies,
+    get_phrase_frequencies_sampled,
+    get_sentence_length_percentiles_sampled,
+    get_speakers,
+    get_turn_pairs,
+    save_phrase_counts,
+    summarize_turns,
+)
+
+
+# name -> (function(conn, cursor, **params), allowed params)
+QUERIES = {
+    'speakers': (get_speakers, ('speaker_type',)),
+    'ingest_generation': (get_ingest_generation, ()),
+    'percentiles': (get_messages_sentence_length_percentiles_sqlite, ('speaker_type', 'speaker_id')),
+    'longest_messages': (get_messages_above_percentile_sqlite, ('speaker_type', 'percentile', 'speaker_id')),
+    'phrase_frequencies': (get_phrase_frequencies, ('speaker_type', 'limit', 'num_words', 'speaker_id')),
+    'turn_pairs': (get_turn_pairs, ('speaker_id',)),
+    # Sampling mode: approximate results with confidence intervals from `message_sample`.
+    'percentiles_sampled': (get_sentence_length_percentiles_sampled, ('speaker_type', 'speaker_id')),
+    'longest_messages_sampled': (
+        get_messages_above_percentile_sampled, ('speaker_type', 'percentile', 'speaker_id', 'limit')
+    ),
+    'phrase_frequencies_sampled': (
+        get_phrase_frequencies_sampled, ('speaker_type', 'limit', 'num_words', 'speaker_id')
+    ),
+    'turn_summary': (
+        lambda conn, cursor, speaker_id=None: summarize_turns(get_turn_pairs(conn, cursor, speaker_id)),
+        ('speaker_id',)
+    ),
+}
+
+PARAM_TYPES = {
+    'speaker_type': str,
+    'speaker_id': int,
+    'limit': int,
+    'num_words': int,
+    'percentile': float,
+}
+
+
+class QueryServiceError(Exception):
+    pass
+
+
+def parse_params(name: str, raw_params: dict):
+    """Validates and converts string query parameters for query `name`."""
+    if name not in QUERIES:
+        raise KeyError(name)
+    _, allowed = QUERIES[name]
+    params = {}
+    for key, value in raw_params.items():
+        if key not in allowed:
+            raise ValueError(f"unknown parameter '{key}' for query '{name}'")
+        params[key] = PARAM_TYPES[key](value) if isinstance(value, str) else value
+    return params
+
+
+def run_local_query(conn, name: str, **params):
+    """Runs query `name` directly on `conn` (the non-service code path)."""
+    function, _ = QUERIES[name]
+    return function(conn, conn.cursor(), **params)
+
+
+def _to_json(value):
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def _encode(result):
+    return json.dumps({'result': result}, default=_to_json).encode()
+
+
+class QueryService:
+    """
+    Runs queries on a pool of read-only connections in worker threads
+    (sqlite3 releases the GIL while a statement runs), coalescing identical
+    in-flight requests and caching results per database version.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, pool_size: int = 4, cache_size: int = 256):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.cache_size = cache_size
+        self.executor = ThreadPoolExecutor(pool_size, thread_name_prefix="lyra-query")
+        self.connections = None
+        self.cache = OrderedDict()
+        self.in_flight = {}
+        self.stats = {'requests': 0, 'cache_hits': 0, 'coalesced': 0, 'executed': 0}
+        self._version_conn = self._connect()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only = ON;")
+        return conn
+
+    async def start(self):
+        self.connections = asyncio.Queue()
+        for _ in range(self.pool_size):
+            self.connections.put_nowait(self._connect())
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        while self.connections is not None and not self.connections.empty():
+            self.connections.get_nowait().close()
+        self._version_conn.close()
+        if self._writer is not None:
+            self._writer.close()
+
+    def version(self):
+        """
+        Changes whenever another connection commits to the database
+        (PRAGMA data_version) or the file is replaced by a new ingest.
+        """
+        data_version = self._version_conn.execute("PRAGMA data_version;").fetchone()[0]
+        stamps = []
+        for path in (self.db_path, self.db_path + "-wal"):
+            try:
+                stat = os.stat(path)
+                stamps.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                stamps.append(None)
+        return data_version, tuple(stamps)
+
+    def _save_phrase_counts(self, cache_key, generation, counts, scanned):
+        """Saves lazy phrase counts through the service's single writable connection."""
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = sqlite3.connect(self.db_path, check_same_thread=False)
+            return save_phrase_counts(self._writer, self._writer.cursor(), cache_key, generation, counts, scanned)
+
+    def _execute(self, conn, name, params):
+        if name == 'phrase_frequencies':
+            # Pool connections are read-only, so computed lazy counts go through the writer.
+            params = dict(params, save_counts=self._save_phrase_counts)
+        return run_local_query(conn, name, **params)
+
+    async def query(self, name: str, params: dict):
+        self.stats['requests'] += 1
+        key = (name, tuple(sorted(params.items())))
+        version = self.version()
+
+        cached = self.cache.get(key)
+        if cached is not None and cached[0] == version:
+            self.cache.move_to_end(key)
+            self.stats['cache_hits'] += 1
+            return cached[1]
+
+        in_flight = self.in_flight.get(key)
+        if in_flight is not None and in_flight[0] == version:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(in_flight[1])
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = (version, future)
+        conn = await self.connections.get()
+        try:
+            self.stats['executed'] += 1
+            result = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self._execute, conn, name, params
+            )
+            # Round-trip through JSON once so cached and fresh results look the same.
+            result = json.loads(_encode(result))['result']
+            future.set_result(result)
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so a request nobody coalesced onto doesn't log a warning.
+            future.exception()
+            raise
+        finally:
+            self.connections.put_nowait(conn)
+            if self.in_flight.get(key, (None, None))[1] is future:
+                del self.in_flight[key]
+
+        if self.cache_size:
+            self.cache[key] = (version, result)
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return result
+
+    async def handle(self, reader, writer):
+        """Minimal HTTP/1.1 handler: GET /query/<name>?params, GET /stats, GET /health."""
+        status, body = 200, b''
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            method, target, _ = request_line.decode('latin-1').split(' ', 2)
+            url = urlsplit(target)
+            if method != 'GET':
+                status, body = 405, json.dumps({'error': 'only GET is supported'}).encode()
+            elif url.path == '/health':
+                body = json.dumps({'ok': True}).encode()
+            elif url.path == '/stats':
+                body = json.dumps(self.stats).encode()
+            elif url.path.startswith('/query/'):
+                name = url.path[len('/query/'):]
+                try:
+                    params = parse_params(name, dict(parse_qsl(url.query)))
+                except KeyError:
+                    status, body = 404, json.dumps({'error': f"unknown query '{name}'"}).encode()
+                except ValueError as e:
+                    status, body = 400, json.dumps({'error': str(e)}).encode()
+                else:
+                    body = _encode(await self.query(name, params))
+            else:
+                status, body = 404, json.dumps({'error': 'not found'}).encode()
+        except Exception as e:
+            status, body = 500, json.dumps({'error': f"{type(e).__name__}: {e}"}).encode()
+
+        reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}.get(status, 'Error')
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+async def serve(
+    db_path: str = DB_PATH,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    unix_socket: Optional[str] = None,
+    pool_size: int = 4,
+    cache_size: int = 256
+):
+    service = QueryService(db_path, pool_size, cache_size)
+    await service.start()
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = await asyncio.start_unix_server(service.handle, path=unix_socket)
+        print(f"Serving {db_path} on unix:{unix_socket}")
+    else:
+        server = await asyncio.start_server(service.handle, host, port)
+        print(f"Serving {db_path} on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class QueryClient:
+    """
+    Thin client for the query service.
+    `url` is 'http://host:port' or 'unix:/path/to/socket'.
+    """
+
+    def __init__(self, url: str, timeout: float = 60.0):
+        self.url = url
+        self.timeout = timeout
+
+    def _connection(self):
+        if self.url.startswith("unix:"):
+            return _UnixHTTPConnection(self.url[len("unix:"):], self.timeout)
+        parts = urlsplit(self.url)
+        return http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=self.timeout)
+
+    def get(self, path: str):
+        conn = self._connection()
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            payload = json.loads(response.read())
+        finally:
+            conn.close()
+        if response.status != 200:
+            raise QueryServiceError(payload.get('error', f"HTTP {response.status}"))
+        return payload
+
+    def call(self, name: str, **params):
+        params = {key: value for key, value in params.items() if value is not None}
+        query = f"?{urlencode(params)}" if params else ""
+        return self.get(f"/query/{name}{query}")['result']
+
+    def stats(self):
+        return self.get("/stats")
@@ -0,0 +1,144 @@
+
+'''
+Batch report: runs every dashboard panel's query for each speaker group
+over one shared connection/cursor and writes the results as JSON, CSV or HTML.
+'''
+
+from datetime import datetime
+from typing import Optional
+import csv
+import html
+import json
+import os
+import pandas as pd
+
+from .run_dashboard import (
+    get_messages_above_percentile_sqlite,
+    get_messages_sentence_length_percentiles_sqlite,
+    get_phrase_frequencies,
+    get_speakers,
+    get_turn_pairs,
+    summarize_turns,
+)
+
+
+def _plain(value):
+    """Converts numpy scalars / NaN to plain JSON-friendly values."""
+    if value is None or pd.isna(value):
+        return None
+    return value.item() if hasattr(value, 'item') else value
+
+
+def build_report(
+    conn,
+    cursor,
+    limit: int = 50,
+    percentile: float = 0.95,
+    per_user: bool = False,
+    longest_limit: Optional[int] = 20
+):
+    """
+    Returns a dict with one entry per speaker group (Lyra, User and, with
+    `per_user`, every named user) holding the Sentence Length percentiles,
+    the longest messages above `percentile`, the top `limit` words and
+    bigrams, and the turn summary.
+    """
+    groups = [("Lyra", "lyra", None), ("User", "user", None)]
+    if per_user:
+        groups += [(name, "user", s_id) for s_id, _, name in get_speakers(conn, cursor, "user")]
+
+    speakers = []
+    for label, speaker_type, speaker_id in groups:
+        percentiles = get_messages_sentence_length_percentiles_sqlite(conn, cursor, speaker_type, speaker_id)
+        longest = get_messages_above_percentile_sqlite(
+            conn, cursor, speaker_type, percentile=percentile, speaker_id=speaker_id
+        )
+        words = get_phrase_frequencies(conn, cursor, speaker_type, limit=limit, num_words=1, speaker_id=speaker_id)
+        bigrams = get_phrase_frequencies(conn, cursor, speaker_type, limit=limit, num_words=2, speaker_id=speaker_id)
+        turns = summarize_turns(get_turn_pairs(conn, cursor, speaker_id)) if speaker_type == "user" else None
+
+        speakers.append({
+            'speaker': label,
+            'speaker_type': speaker_type,
+            'speaker_id': speaker_id,
+            'percentiles': {key: _plain(value) for key, value in percentiles.items()},
+            'longest_messages': longest[:longest_limit] if longest_limit is not None else longest,
+            'top_words': [{'phrase': phrase, 'frequency': freq} for phrase, freq in words],
+            'top_bigrams': [{'phrase': phrase, 'frequency': freq} for phrase, freq in bigrams],
+            'turns': {key: _plain(value) for key, value in turns.items()} if turns is not None else None
+        })
+
+    return {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'percentile': percentile,
+        'limit': limit,
+        'speakers': speakers
+    }
+
+
+def write_report_json(report: dict, path: str):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+def write_report_csv(report: dict, out_dir: str):
+    """Writes percentiles.csv, longest_messages.csv, phrases.csv and turns.csv into `out_dir`."""
+    os.makedirs(out_dir, exist_ok=True)
+    speakers = report['speakers']
+
+    with open(os.path.join(out_dir, "percentiles.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        keys = list(speakers[0]['percentiles']) if speakers else []
+        writer.writerow(["speaker", "speaker_type"] + keys)
+        for entry in speakers:
+            writer.writerow([entry['speaker'], entry['speaker_type']] + [entry['percentiles'][k] for k in keys])
+
+    with open(os.path.join(out_dir, "longest_messages.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["speaker", "rank", "text"])
+        for entry in speakers:
+            for rank, text in enumerate(entry['longest_messages'], start=1):
+                writer.writerow([entry['speaker'], rank, text])
+
+    with open(os.path.join(out_dir, "phrases.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["speaker", "num_words", "rank", "phrase", "frequency"])
+        for entry in speakers:
+            for num_words, key in ((1, 'top_words'), (2, 'top_bigrams')):
+                for rank, row in enumerate(entry[key], start=1):
+                    writer.writerow([entry['speaker'], num_words, rank, row['phrase'], row['frequency']])
+
+    with open(os.path.join(out_dir, "turns.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["speaker", "turns", "correlation", "median_response_words", "median_turn_gap"])
+        for entry in speakers:
+            if entry['turns'] is not None:
+                turns = entry['turns']
+                writer.writerow([
+                    entry['speaker'], turns['turns'], turns['correlation'],
+                    turns['median_response_words'], turns['median_turn_gap']
+                ])
+
+
+def write_report_html(report: dict, path: str):
+    parts = [
+        "<html><head><meta charset='utf-8'><title>Lyra Analysis Report</title></head><body>",
+        f"<h1>Lyra Analysis Report</h1><p>Generated {html.escape(report['generated_at'])}</p>"
+    ]
+    for entry in report['speakers']:
+        parts.append(f"<h2>{html.escape(entry['speaker'])}</h2>")
+        parts.append("<h3>Sentence Length</h3>")
+        parts.append(pd.DataFrame([entry['percentiles']]).to_html(index=False))
+        if entry['turns'] is not None:
+            parts.append("<h3>Turns</h3>")
+            parts.append(pd.DataFrame([entry['turns']]).to_html(index=False))
+        parts.append(f"<h3>Longest Messages (above p{int(report['percentile'] * 100)})</h3><ol>")
+        parts.extend(f"<li>{html.escape(text)}</li>" for text in entry['longest_messages'])
+        parts.append("</ol>")
+        parts.append("<h3>Top Words</h3>")
+        parts.append(pd.DataFrame(entry['top_words'], columns=["phrase", "frequency"]).to_html(index=False))
+        parts.append("<h3>Top Bigrams</h3>")
+        parts.append(pd.DataFrame(entry['top_bigrams'], columns=["phrase", "frequency"]).to_html(index=False))
+    parts.append("</body></html>")
+    with open(path, "w") as f:
+        f.write("\n".join(parts))
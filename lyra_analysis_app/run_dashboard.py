@@ -1,19 +1,100 @@
 
+from bisect import bisect_left
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import accumulate
 from typing import Optional, List
+import math
+import multiprocessing
+import os
 import pandas as pd
 import sqlite3
+import sys
+import threading
 
+from .ingest_transcripts_sqlite import (
+    count_phrases,
+    get_meta,
+    phrase_cache_key,
+    phrase_tokenizer,
+    text_decoder,
+)
 
-def get_messages_sentence_length_percentiles_sqlite(conn, cursor, speaker_type: Optional[str] = None):
+# Messages per task in the parallel lazy phrase scan.
+LAZY_SCAN_CHUNK = 2000
+
+# Process pools for the parallel lazy phrase scan, by size. They are started
+# with "spawn" on first use and then reused: the callers are Streamlit script
+# threads and query service worker threads, which must not fork.
+_SCAN_POOLS = {}
+_SCAN_POOLS_LOCK = threading.Lock()
+
+PERCENTILES = {'p5': 0.05, 'p10': 0.10, 'p25': 0.25, 'p50': 0.50, 'p75': 0.75, 'p90': 0.90, 'p95': 0.95}
+
+# Normal quantile for the two-sided 95% intervals reported in sampling mode.
+CONFIDENCE_Z = 1.96
+
+# Sampled phrase counts fall back to the exact query when the sample holds
+# more than this share of the matching messages (small corpora, where the
+# per-stratum minimum keeps most of them), since it is no cheaper there.
+SAMPLED_EXACT_FRACTION = 0.4
+
+
+def _speaker_filter(speaker_type: Optional[str] = None, speaker_id: Optional[int] = None, alias: str = ""):
     """
-    Returns key percentiles (5th, 10th, 25th, 50th, 75th, 90th, 95th)
-    of the 'word_count' column from the 'messages' table.
+    Builds the WHERE clause (without the keyword) and params restricting
+    messages to a speaker type and/or a single speaker.
+    Returns ("", ()) when neither is given.
+    """
+    prefix = f"{alias}." if alias else ""
+    clauses = []
+    params = []
+    if speaker_id is not None:
+        clauses.append(f"{prefix}speaker_id = ?")
+        params.append(speaker_id)
+    elif speaker_type:
+        clauses.append(f"{prefix}speaker_type = ?")
+        params.append(speaker_type)
+    return " AND ".join(clauses), tuple(params)
+
+
+def get_speakers(conn, cursor, speaker_type: Optional[str] = None):
+    """
+    Returns (id, speaker_type, name) rows from the 'speakers' table,
+    optionally restricted to one speaker type, ordered by name.
     """
     if speaker_type is not None:
         cursor.execute(
-            "SELECT word_count FROM messages WHERE speaker_type = ?",
+            "SELECT id, speaker_type, name FROM speakers WHERE speaker_type = ? ORDER BY name",
             (speaker_type,)
         )
+    else:
+        cursor.execute("SELECT id, speaker_type, name FROM speakers ORDER BY name")
+    return cursor.fetchall()
+
+
+def get_ingest_generation(conn, cursor):
+    """Returns meta 'ingest_generation', which every ingest (and `watch` batch) bumps."""
+    return int(get_meta(cursor, 'ingest_generation', 0))
+
+
+def get_messages_sentence_length_percentiles_sqlite(
+    conn,
+    cursor,
+    speaker_type: Optional[str] = None,
+    speaker_id: Optional[int] = None
+):
+    """
+    Returns key percentiles (5th, 10th, 25th, 50th, 75th, 90th, 95th)
+    of the 'word_count' column from the 'messages' table.
+
+    If `speaker_id` is given only that speaker's messages are used,
+    otherwise messages are restricted to `speaker_type` (if any).
+    """
+    where, params = _speaker_filter(speaker_type, speaker_id)
+    if where:
+        cursor.execute(f"SELECT word_count FROM messages WHERE {where}", params)
     else:
         cursor.execute("SELECT word_count FROM messages")
 
@@ -114,7 +195,8 @@ def get_messages_above_percentile_sqlite(
     conn: sqlite3.Connection,
     cursor: sqlite3.Cursor,
     speaker_type: Optional[str] = None,
-    percentile: float = 0.75
+    percentile: float = 0.75,
+    speaker_id: Optional[int] = None
 ) -> List[str]:
     """
     Returns all messages for a given speaker_type whose word_count exceeds
@@ -124,99 +206,466 @@ def get_messages_above_percentile_sqlite(
     :param cursor: sqlite3 cursor
     :param speaker_type: string, e.g., 'lyra'
     :param percentile: float, 0 < percentile < 1
+    :param speaker_id: optional speakers.id, takes precedence over speaker_type
     :return: list of messages (strings)
     """
-    # Step 1: Fetch word_counts and messages
-    if speaker_type:
-        cursor.execute(
-            "SELECT word_count, text, tag FROM messages WHERE speaker_type = ? AND tag != '[Lyra Raw History]';",
-            (speaker_type,)
-        )
-    else:
-        cursor.execute("SELECT word_count, text, tag FROM messages WHERE tag != '[Lyra Raw History]';")
+    # Step 1: Fetch word_counts. Excluded tags (e.g. '[Lyra Raw History]')
+    # are filtered out at ingest by the database's FilterRules.
+    where, params = _speaker_filter(speaker_type, speaker_id)
+    speaker_clause = f"{where} AND " if where else ""
+    cursor.execute(f"SELECT word_count FROM messages WHERE {speaker_clause}1;", params)
 
     rows = cursor.fetchall()
     if not rows:
         return []
 
-    df = pd.DataFrame(rows, columns=["word_count", "text", "tag"])
-    print(df)
+    df = pd.DataFrame(rows, columns=["word_count"])
 
     # Step 2: Compute threshold
     threshold = df["word_count"].quantile(percentile)
 
-    # Step 3: Select messages above threshold
-    messages_above = df[df["word_count"] > threshold]["text"].tolist()
+    # Step 3: Select messages above threshold. Only these rows' text is read
+    # (and decompressed, with compressed text storage). The decoder reads
+    # meta with the cursor, so it is built before the query.
+    decode = text_decoder(cursor)
+    cursor.execute(
+        f"SELECT text FROM messages WHERE {speaker_clause}word_count > ? ORDER BY id;",
+        params + (float(threshold),)
+    )
+    messages_above = [decode(row[0]) for row in cursor.fetchall()]
 
     return messages_above
 
-def get_phrase_frequencies(conn, cursor, speaker_type: str, limit: Optional[int] = 10, num_words: int = 2):
+def get_phrase_frequencies(
+    conn,
+    cursor,
+    speaker_type: Optional[str],
+    limit: Optional[int] = 10,
+    num_words: int = 2,
+    speaker_id: Optional[int] = None,
+    save_counts=None
+):
+    """
+    Returns the `limit` most frequent (phrase, frequency) pairs of `num_words` words,
+    for a speaker_type or, if `speaker_id` is given, a single speaker.
+
+    In lazy phrase mode the counts come from `get_phrase_frequencies_lazy`
+    (which `save_counts` is passed to).
+    """
+    if get_meta(cursor, 'phrase_mode', 'eager') == 'lazy':
+        return get_phrase_frequencies_lazy(
+            conn, cursor, speaker_type, limit, num_words, speaker_id, save_counts=save_counts
+        )
+
+    where, params = _speaker_filter(speaker_type, speaker_id, alias="m")
+    speaker_clause = f"{where} AND " if where else ""
     query = f"""
     SELECT
         p.text AS phrase_text,
         COUNT(*) AS frequency
     FROM messages m
     JOIN phrases p ON m.id = p.message_id
-    WHERE m.speaker_type = ? AND p.num_words = ?
+    WHERE {speaker_clause}p.num_words = ?
     GROUP BY p.text
     ORDER BY frequency DESC
     LIMIT {limit};
     """
-    cursor.execute(query, (speaker_type, num_words))
+    cursor.execute(query, params + (num_words,))
     return cursor.fetchall()
 
 
-def main():
-    print("hello world.")
-    conn = psycopg2.connect(
-        dbname="lyradb",
-        user="postgres",
-        password="password",
-        host="localhost",
-        port=5433
+def _scan_phrases_worker(db_path: str, where: str, params: tuple, id_range: tuple, num_words: int):
+    """Process-pool task: counts phrases for messages with id in [lo, hi) matching `where`."""
+    lo, hi = id_range
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        decode = text_decoder(conn.cursor())
+        tokenizer = phrase_tokenizer(conn.cursor())
+        rows = conn.execute(
+            f"SELECT text FROM messages WHERE {where} id >= ? AND id < ?",
+            params + (lo, hi)
+        ).fetchall()
+    finally:
+        conn.close()
+    return count_phrases((decode(row[0]) for row in rows), num_words, tokenizer), len(rows)
+
+
+def _scan_pool(workers: int):
+    with _SCAN_POOLS_LOCK:
+        pool = _SCAN_POOLS.get(workers)
+        if pool is None:
+            pool = _SCAN_POOLS[workers] = ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return pool
+
+
+def _database_path(cursor):
+    cursor.execute("PRAGMA database_list;")
+    for _, name, path in cursor.fetchall():
+        if name == 'main':
+            return path or None
+    return None
+
+
+def compute_phrase_counts(
+    conn,
+    cursor,
+    speaker_type: Optional[str],
+    num_words: int,
+    speaker_id: Optional[int] = None,
+    workers: Optional[int] = None
+):
+    """
+    Tokenizes the matching messages and returns (Counter of phrases, messages scanned).
+
+    For a file-backed database the scan is split into id ranges counted in a
+    shared process pool of `workers` (default: CPU count); otherwise, or if
+    the pool breaks, it runs in-process.
+    """
+    where, params = _speaker_filter(speaker_type, speaker_id)
+    where_clause = f"{where} AND " if where else ""
+    workers = workers or os.cpu_count() or 1
+    db_path = _database_path(cursor)
+
+    cursor.execute(f"SELECT COUNT(*), MIN(id), MAX(id) FROM messages WHERE {where_clause}1", params)
+    n_messages, min_id, max_id = cursor.fetchone()
+    if not n_messages:
+        return Counter(), 0
+
+    if workers > 1 and db_path is not None and n_messages > LAZY_SCAN_CHUNK:
+        # Split the id span so each task scans roughly LAZY_SCAN_CHUNK matching messages.
+        n_tasks = max(n_messages // LAZY_SCAN_CHUNK, workers)
+        step = (max_id - min_id) // n_tasks + 1
+        ranges = [(lo, lo + step) for lo in range(min_id, max_id + 1, step)]
+
+        counts = Counter()
+        scanned = 0
+        pool = _scan_pool(workers)
+        try:
+            futures = [
+                pool.submit(_scan_phrases_worker, db_path, where_clause, params, id_range, num_words)
+                for id_range in ranges
+            ]
+            for future in futures:
+                partial, n_rows = future.result()
+                counts.update(partial)
+                scanned += n_rows
+            return counts, scanned
+        except BrokenProcessPool:
+            # A worker died or could not start: drop the pool and scan in-process.
+            with _SCAN_POOLS_LOCK:
+                if _SCAN_POOLS.get(workers) is pool:
+                    del _SCAN_POOLS[workers]
+
+    decode = text_decoder(cursor)
+    tokenizer = phrase_tokenizer(cursor)
+    cursor.execute(f"SELECT text FROM messages WHERE {where_clause}1", params)
+    return count_phrases((decode(row[0]) for row in cursor.fetchall()), num_words, tokenizer), n_messages
+
+
+def save_phrase_counts(conn, cursor, cache_key: str, generation: int, counts: Counter, scanned: int):
+    """
+    Persists one combination's counts in `phrase_cache` under `generation` and
+    commits. Returns False (saving nothing) if an ingest has moved the
+    database past `generation` since the counts were computed.
+    """
+    if int(get_meta(cursor, 'ingest_generation', 0)) != generation:
+        return False
+    try:
+        cursor.execute("DELETE FROM phrase_cache WHERE cache_key = ?", (cache_key,))
+        cursor.executemany(
+            "INSERT INTO phrase_cache (cache_key, generation, text, frequency) VALUES (?, ?, ?, ?)",
+            ((cache_key, generation, text, frequency) for text, frequency in counts.items())
+        )
+        cursor.execute(
+            "INSERT OR REPLACE INTO phrase_cache_entries (cache_key, generation, messages_scanned) VALUES (?, ?, ?)",
+            (cache_key, generation, scanned)
+        )
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return True
+
+
+def get_phrase_frequencies_lazy(
+    conn,
+    cursor,
+    speaker_type: Optional[str],
+    limit: Optional[int] = 10,
+    num_words: int = 2,
+    speaker_id: Optional[int] = None,
+    workers: Optional[int] = None,
+    save_counts=None
+):
+    """
+    Lazy-mode `get_phrase_frequencies`: phrase counts for the combination are
+    computed by `compute_phrase_counts` on first request and persisted in
+    `phrase_cache` under the current ingest generation. Later requests (with
+    any `limit`) are an indexed read until the next ingest bumps the generation.
+
+    The counts are saved with `save_counts(cache_key, generation, counts, scanned)`,
+    by default `save_phrase_counts` on `conn`; callers holding a read-only
+    connection pass one that writes through a writable connection.
+    """
+    key = phrase_cache_key(speaker_type, speaker_id, num_words)
+    generation = int(get_meta(cursor, 'ingest_generation', 0))
+
+    cursor.execute(
+        "SELECT 1 FROM phrase_cache_entries WHERE cache_key = ? AND generation = ?",
+        (key, generation)
+    )
+    if cursor.fetchone() is None:
+        counts, scanned = compute_phrase_counts(conn, cursor, speaker_type, num_words, speaker_id, workers)
+        if save_counts is None:
+            saved = save_phrase_counts(conn, cursor, key, generation, counts, scanned)
+        else:
+            saved = save_counts(key, generation, counts, scanned)
+        if not saved:
+            # Superseded by a newer ingest while counting.
+            return counts.most_common(limit if limit is not None and limit >= 0 else None)
+
+    cursor.execute(
+        f"""
+        SELECT text, frequency FROM phrase_cache
+        WHERE cache_key = ? AND generation = ?
+        ORDER BY frequency DESC
+        LIMIT {limit};
+        """,
+        (key, generation)
+    )
+    return cursor.fetchall()
+
+
+def _sampled_word_counts(cursor, speaker_type: Optional[str], speaker_id: Optional[int]):
+    """Returns (sorted word counts, cumulative weights, effective sample size) from `message_sample`."""
+    where, params = _speaker_filter(speaker_type, speaker_id)
+    cursor.execute(
+        f"SELECT word_count, weight FROM message_sample {'WHERE ' + where if where else ''} ORDER BY word_count",
+        params
     )
+    rows = cursor.fetchall()
+    weights = [weight for _, weight in rows]
+    squares = sum(weight * weight for weight in weights)
+    n_effective = sum(weights) ** 2 / squares if squares else 0
+    return [word_count for word_count, _ in rows], list(accumulate(weights)), n_effective
+
 
-    cur = conn.cursor()
+def _weighted_quantile(values, cumulative, q: float):
+    index = bisect_left(cumulative, q * cumulative[-1])
+    return values[min(index, len(values) - 1)]
 
-    # What are the visualizations we need?
 
-    # For each visualization, what data do we need?
+def get_sentence_length_percentiles_sampled(
+    conn,
+    cursor,
+    speaker_type: Optional[str] = None,
+    speaker_id: Optional[int] = None,
+    z: float = CONFIDENCE_Z
+):
+    """
+    Sampling-mode `get_messages_sentence_length_percentiles_sqlite`: weighted
+    percentiles of `message_sample`, each with a distribution-free interval
+    from the order statistics at q +/- z * sqrt(q(1 - q) / n_eff), where n_eff
+    is the effective size of the weighted sample.
 
-    # (1) GET most frequent words/bigrams said by model with frequency.
+    Returns {'percentiles': {...}, 'intervals': {key: (low, high)},
+    'sample_size': sampled messages, 'population': messages they represent}.
+    """
+    values, cumulative, n_effective = _sampled_word_counts(cursor, speaker_type, speaker_id)
+    if not values:
+        return {
+            'percentiles': {key: None for key in PERCENTILES},
+            'intervals': {key: (None, None) for key in PERCENTILES},
+            'sample_size': 0,
+            'population': 0
+        }
+
+    percentiles = {}
+    intervals = {}
+    for key, q in PERCENTILES.items():
+        margin = z * math.sqrt(q * (1 - q) / n_effective)
+        percentiles[key] = _weighted_quantile(values, cumulative, q)
+        intervals[key] = (
+            _weighted_quantile(values, cumulative, max(q - margin, 0.0)),
+            _weighted_quantile(values, cumulative, min(q + margin, 1.0))
+        )
+    return {
+        'percentiles': percentiles,
+        'intervals': intervals,
+        'sample_size': len(values),
+        'population': round(cumulative[-1])
+    }
 
-    # (2) GET most frequent words/bigrams said by user with frequency.
 
-    # (3a) GET percentiles for number of words per messages (DONE)
-    # (3b) SHOW messages that have `num_words` exceeding a percentile (DONE)
+def get_messages_above_percentile_sampled(
+    conn,
+    cursor,
+    speaker_type: Optional[str] = None,
+    percentile: float = 0.75,
+    speaker_id: Optional[int] = None,
+    limit: Optional[int] = 100
+):
+    """
+    Sampling-mode `get_messages_above_percentile_sqlite`: the word-count
+    threshold is estimated from `message_sample`, then at most `limit`
+    of the longest messages above it are read through the speaker index
+    instead of loading every message into a DataFrame.
+    """
+    values, cumulative, _ = _sampled_word_counts(cursor, speaker_type, speaker_id)
+    if not values:
+        return []
+    threshold = _weighted_quantile(values, cumulative, percentile)
+
+    where, params = _speaker_filter(speaker_type, speaker_id)
+    speaker_clause = f"{where} AND " if where else ""
+    limit_clause = f"LIMIT {int(limit)}" if limit is not None else ""
+    decode = text_decoder(cursor)
+    cursor.execute(
+        f"""
+        SELECT text FROM messages
+        WHERE {speaker_clause}word_count > ?
+        ORDER BY word_count DESC
+        {limit_clause};
+        """,
+        params + (threshold,)
+    )
+    return [decode(row[0]) for row in cursor.fetchall()]
+
+
+def get_phrase_frequencies_sampled(
+    conn,
+    cursor,
+    speaker_type: Optional[str],
+    limit: Optional[int] = 10,
+    num_words: int = 2,
+    speaker_id: Optional[int] = None,
+    z: float = CONFIDENCE_Z
+):
+    """
+    Sampling-mode `get_phrase_frequencies`: estimated corpus-wide phrase
+    counts from `message_sample`, as (phrase, estimate, low, high) rows.
+
+    Each sampled message's counts are scaled by its weight; the interval
+    is estimate +/- z * sqrt(sum(w * (w - 1) * count^2)), the variance of
+    that estimator under per-message sampling with probability 1 / w.
+    Phrases come from the `phrases` table in eager mode and are tokenized
+    from the sampled texts in lazy mode. If the sample is more than
+    SAMPLED_EXACT_FRACTION of the matching messages, the exact counts are
+    returned instead, with zero-width intervals.
+    """
+    where, params = _speaker_filter(speaker_type, speaker_id, alias="s")
+    speaker_clause = f"{where} AND " if where else ""
 
-    # (4) GET MESSAGES where a specific word or phrase was used.
+    # Weights are stratum size / kept, so they sum to the number of matching messages.
+    cursor.execute(f"SELECT COUNT(*), SUM(s.weight) FROM message_sample s WHERE {speaker_clause}1", params)
+    n_sampled, population = cursor.fetchone()
+    if not n_sampled:
+        return []
+    if n_sampled > SAMPLED_EXACT_FRACTION * population:
+        return [
+            (phrase, frequency, frequency, frequency)
+            for phrase, frequency in get_phrase_frequencies(conn, cursor, speaker_type, limit, num_words, speaker_id)
+        ]
+
+    if get_meta(cursor, 'phrase_mode', 'eager') == 'lazy':
+        decode = text_decoder(cursor)
+        tokenizer = phrase_tokenizer(cursor)
+        cursor.execute(
+            f"SELECT s.weight, m.text FROM message_sample s JOIN messages m ON m.id = s.message_id "
+            f"WHERE {speaker_clause}1",
+            params
+        )
+        estimates = Counter()
+        variances = Counter()
+        for weight, text in cursor.fetchall():
+            for phrase, count in count_phrases([decode(text)], num_words, tokenizer).items():
+                estimates[phrase] += weight * count
+                variances[phrase] += weight * (weight - 1) * count * count
+        rows = [
+            (phrase, estimate, variances[phrase])
+            for phrase, estimate in estimates.most_common(limit if limit is not None and limit >= 0 else None)
+        ]
+    else:
+        cursor.execute(
+            f"""
+            SELECT text, SUM(weight * cnt) AS estimate, SUM(weight * (weight - 1) * cnt * cnt) AS variance
+            FROM (
+                SELECT s.weight AS weight, p.text AS text, COUNT(*) AS cnt
+                FROM message_sample s
+                JOIN phrases p ON p.message_id = s.message_id
+                WHERE {speaker_clause}p.num_words = ?
+                GROUP BY s.message_id, p.text
+            )
+            GROUP BY text
+            ORDER BY estimate DESC
+            LIMIT {limit};
+            """,
+            params + (num_words,)
+        )
+        rows = cursor.fetchall()
 
-    # Outstanding Issue
-    # -> need to remove "uninteresting words", length of less
+    results = []
+    for phrase, estimate, variance in rows:
+        margin = z * math.sqrt(variance)
+        results.append((phrase, round(estimate), max(round(estimate - margin), 0), round(estimate + margin)))
+    return results
 
 
-    # To support the contract, I need to add:
-    # 1. number_of_words in a message. (DONE)
-    # 2. previous_message_id: right now we can do (position - 1).
+def get_turn_pairs(conn, cursor, speaker_id: Optional[int] = None):
+    """
+    Returns (user_word_count, lyra_word_count, turn_gap) rows from the
+    precomputed 'turns' table, one per user message answered by Lyra.
+    `turn_gap` is the number of positions between the user message and the reply.
 
+    If `speaker_id` is given only that user's turns are returned.
+    """
+    if speaker_id is not None:
+        cursor.execute(
+            "SELECT user_word_count, lyra_word_count, turn_gap FROM turns WHERE user_speaker_id = ?",
+            (speaker_id,)
+        )
+    else:
+        cursor.execute("SELECT user_word_count, lyra_word_count, turn_gap FROM turns")
+    return cursor.fetchall()
 
-    # "User message length percentiles"
-    out = get_messages_sentence_length_percentiles(conn, cur, "user")
 
+def summarize_turns(turns):
+    """
+    Summarises rows from `get_turn_pairs`: turn count, correlation of user
+    and Lyra word counts, median response length and median turn gap.
+    """
+    df = pd.DataFrame(turns, columns=["user_word_count", "lyra_word_count", "turn_gap"])
+    if df.empty:
+        return {'turns': 0, 'correlation': None, 'median_response_words': None, 'median_turn_gap': None}
+    return {
+        'turns': len(df),
+        'correlation': df["user_word_count"].corr(df["lyra_word_count"]),
+        'median_response_words': df["lyra_word_count"].median(),
+        'median_turn_gap': df["turn_gap"].median()
+    }
 
-    # Lyra message length percentiles
-    out = get_messages_sentence_length_percentiles(conn, cur, "lyra")
-    print(out)
 
-    # Get user's messages above 0.95 percentile.
-    longest_messages = get_messages_above_percentile(conn, cur, 'user', 0.95)
+# What are the visualizations we need?
+# (1) GET most frequent words/bigrams said by model with frequency. (DONE)
+# (2) GET most frequent words/bigrams said by user with frequency. (DONE)
+# (3a) GET percentiles for number of words per messages (DONE)
+# (3b) SHOW messages that have `num_words` exceeding a percentile (DONE)
+# (4) GET MESSAGES where a specific word or phrase was used.
+#
+# Outstanding Issue
+# -> need to remove "uninteresting words", length of less
+#    (stopwords can now be dropped at ingest via FilterRules)
 
-    phrase_freq = get_phrase_frequencies(conn, cur, 'lyra', limit = 50)
 
-    print(phrase_freq)
+def main():
+    '''Writes the batch report for the default database.
+    Equivalent to `python -m lyra_analysis_app report ...`.
+    '''
+    from .cli import main as cli_main
 
-    conn.close()
-    cur.close()
+    cli_main(["report"] + sys.argv[1:])
 
 
 if __name__ == "__main__":
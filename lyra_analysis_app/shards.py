@@ -0,0 +1,438 @@
+
+'''
+Shard databases written by `ingest_data(..., IngestOptions(shard=ShardSpec(...)))`.
+
+`merge_shards` combines shard databases into one, remapping transcript,
+message and speaker ids and adding up lazy phrase counts.
+`connect_shards` instead attaches the shards to one connection behind
+temporary views, so the `run_dashboard` query functions fan out across
+them unchanged.
+
+    python -m lyra_analysis_app ingest TRANSCRIPTS --db shard0.db --shard hash:0/2
+    python -m lyra_analysis_app ingest TRANSCRIPTS --db shard1.db --shard hash:1/2
+    python -m lyra_analysis_app merge lyra_transcripts.db shard0.db shard1.db
+    python -m lyra_analysis_app report --shards shard0.db shard1.db
+'''
+
+from collections import Counter
+from typing import List, Optional
+import os
+import sqlite3
+
+from .ingest_transcripts_sqlite import (
+    SAMPLE_RATE,
+    build_message_sample,
+    delete_tables,
+    get_meta,
+    load_filter_rules,
+    load_text_codec,
+    parse_phrase_cache_key,
+    phrase_cache_key,
+    save_filter_rules,
+    save_text_codec,
+    set_meta,
+    setup_db,
+)
+
+# Added to a shard's ids in `connect_shards` views so ids from different
+# shards never collide (shard k uses [k << 40, (k + 1) << 40)).
+SHARD_ID_STRIDE = 1 << 40
+
+
+def _shard_settings(path: str):
+    """Reads the settings every shard of one corpus must share."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        cursor = conn.cursor()
+        _, rules = load_filter_rules(cursor)
+        return {
+            'phrase_mode': get_meta(cursor, 'phrase_mode', 'eager'),
+            'filter_rules': rules,
+            'codec': load_text_codec(cursor),
+            'sample_rate': float(get_meta(cursor, 'sample_rate', SAMPLE_RATE)),
+            'generation': int(get_meta(cursor, 'ingest_generation', 0)),
+            'count_duplicates': bool(int(get_meta(cursor, 'count_duplicates', 0))),
+        }
+    finally:
+        conn.close()
+
+
+def _check_compatible(shard_paths: List[str]):
+    if not shard_paths:
+        raise ValueError("no shard databases given")
+    for path in shard_paths:
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+    settings = [_shard_settings(path) for path in shard_paths]
+    for path, shard in zip(shard_paths[1:], settings[1:]):
+        for key in ('phrase_mode', 'filter_rules', 'count_duplicates'):
+            if shard[key] != settings[0][key]:
+                raise ValueError(f"{path} has a different {key} than {shard_paths[0]}")
+    return settings
+
+
+def _phrase_cache_entries(path: str):
+    """
+    Returns {(speaker_type, speaker name or None, num_words): (Counter, messages_scanned)}
+    for the shard's current-generation lazy phrase counts.
+    """
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        cursor = conn.cursor()
+        generation = int(get_meta(cursor, 'ingest_generation', 0))
+        cursor.execute(
+            "SELECT cache_key, messages_scanned FROM phrase_cache_entries WHERE generation = ?",
+            (generation,)
+        )
+        entries = {}
+        for cache_key, scanned in cursor.fetchall():
+            parsed = parse_phrase_cache_key(cache_key)
+            if parsed is None:
+                continue
+            speaker_type, speaker_id, num_words = parsed
+            if speaker_id is not None:
+                cursor.execute("SELECT speaker_type, name FROM speakers WHERE id = ?", (speaker_id,))
+                row = cursor.fetchone()
+                if row is None:
+                    continue
+                key = (row[0], row[1], num_words)
+            else:
+                key = (speaker_type or '*', None, num_words)
+            cursor.execute(
+                "SELECT text, frequency FROM phrase_cache WHERE cache_key = ? AND generation = ?",
+                (cache_key, generation)
+            )
+            entries[key] = (Counter(dict(cursor.fetchall())), scanned)
+        return entries
+    finally:
+        conn.close()
+
+
+def _has_messages(path: str, speaker_type: str, name: Optional[str]):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        if name is not None:
+            query, params = (
+                "SELECT 1 FROM messages m JOIN speakers s ON s.id = m.speaker_id "
+                "WHERE s.speaker_type = ? AND s.name = ? LIMIT 1", (speaker_type, name)
+            )
+        elif speaker_type == '*':
+            query, params = "SELECT 1 FROM messages LIMIT 1", ()
+        else:
+            query, params = "SELECT 1 FROM messages WHERE speaker_type = ? LIMIT 1", (speaker_type,)
+        return conn.execute(query, params).fetchone() is not None
+    finally:
+        conn.close()
+
+
+def _merge_phrase_caches(cursor, shard_paths: List[str], generation: int, partial=()):
+    """
+    Adds up lazy phrase counts. A combination is kept only if every shard
+    holding messages for it has computed it; the rest are recomputed on
+    first request as usual. The caches of shards in `partial` (some of
+    their transcripts were skipped as duplicates) also count the skipped
+    messages, so they are not used.
+    """
+    per_shard = [{} if path in partial else _phrase_cache_entries(path) for path in shard_paths]
+    for key in set().union(*per_shard):
+        speaker_type, name, num_words = key
+        counts = Counter()
+        scanned = 0
+        for path, entries in zip(shard_paths, per_shard):
+            if key in entries:
+                shard_counts, shard_scanned = entries[key]
+                counts.update(shard_counts)
+                scanned += shard_scanned or 0
+            elif _has_messages(path, speaker_type, name):
+                break
+        else:
+            speaker_id = None
+            if name is not None:
+                cursor.execute("SELECT id FROM speakers WHERE speaker_type = ? AND name = ?", (speaker_type, name))
+                speaker_id = cursor.fetchone()[0]
+            cache_key = phrase_cache_key(None if speaker_type == '*' else speaker_type, speaker_id, num_words)
+            cursor.executemany(
+                "INSERT INTO phrase_cache (cache_key, generation, text, frequency) VALUES (?, ?, ?, ?)",
+                ((cache_key, generation, text, frequency) for text, frequency in counts.items())
+            )
+            cursor.execute(
+                "INSERT OR REPLACE INTO phrase_cache_entries (cache_key, generation, messages_scanned) VALUES (?, ?, ?)",
+                (cache_key, generation, scanned)
+            )
+
+
+def merge_shards(shard_paths: List[str], out_path: str):
+    """
+    Combines shard databases into a single database at `out_path`
+    (replacing its contents).
+
+    Speakers are matched by (speaker_type, name); transcript and message
+    ids are offset past the rows already merged; a transcript whose file
+    path was already merged from an earlier shard is skipped, as is (unless
+    the shards were ingested with `count_duplicates`) one whose content
+    was, so date-range shards deduplicate like a single ingest. Text
+    compressed with a different dictionary is re-encoded with the first
+    shard's codec. Lazy phrase counts are summed across shards that had
+    nothing skipped (see `_merge_phrase_caches`) and `message_sample` is
+    rebuilt.
+
+    Returns {'shards', 'transcripts', 'messages', 'transcripts_skipped'}.
+    """
+    settings = _check_compatible(shard_paths)
+    if os.path.abspath(out_path) in {os.path.abspath(path) for path in shard_paths}:
+        raise ValueError("the merged database must not be one of the shards")
+
+    conn = sqlite3.connect(out_path)
+    try:
+        cur = conn.cursor()
+        delete_tables(conn, cur)
+        setup_db(conn, cur)
+        set_meta(cur, 'phrase_mode', settings[0]['phrase_mode'])
+        if settings[0]['filter_rules'] is not None:
+            save_filter_rules(cur, settings[0]['filter_rules'])
+        out_codec = settings[0]['codec']
+        save_text_codec(cur, out_codec)
+
+        skipped = 0
+        partial = set()
+        for path, shard in zip(shard_paths, settings):
+            cur.execute("ATTACH DATABASE ? AS shard", (path,))
+
+            text_column = "m.text"
+            shard_codec = shard['codec']
+            same_codec = (
+                (shard_codec is None and out_codec is None)
+                or (shard_codec is not None and out_codec is not None
+                    and (shard_codec.codec, shard_codec.dictionary) == (out_codec.codec, out_codec.dictionary))
+            )
+            if not same_codec:
+                decode = shard_codec.decode if shard_codec is not None else (lambda value: value)
+                encode = out_codec.encode if out_codec is not None else (lambda text: text)
+                conn.create_function("merge_text", 1, lambda value: encode(decode(value)), deterministic=True)
+                text_column = "merge_text(m.text)"
+
+            cur.execute("SELECT COALESCE(MAX(id), 0) FROM main.transcripts")
+            transcript_offset = cur.fetchone()[0]
+            cur.execute("SELECT COALESCE(MAX(id), 0) FROM main.messages")
+            message_offset = cur.fetchone()[0]
+
+            cur.execute(
+                "INSERT OR IGNORE INTO main.speakers (speaker_type, name) "
+                "SELECT speaker_type, name FROM shard.speakers ORDER BY id"
+            )
+            cur.execute("DROP TABLE IF EXISTS temp.speaker_map")
+            cur.execute(
+                """
+                CREATE TEMP TABLE speaker_map AS
+                SELECT s.id AS old_id, m.id AS new_id
+                FROM shard.speakers s
+                JOIN main.speakers m ON m.speaker_type = s.speaker_type AND m.name IS s.name
+                """
+            )
+            cur.execute("CREATE INDEX temp.idx_speaker_map ON speaker_map (old_id)")
+            cur.execute("DROP TABLE IF EXISTS temp.skipped_transcripts")
+            duplicate_content = "" if shard['count_duplicates'] else (
+                "OR s.content_hash IN (SELECT content_hash FROM main.transcripts)"
+            )
+            cur.execute(
+                f"""
+                CREATE TEMP TABLE skipped_transcripts AS
+                SELECT s.id, s.filepath FROM shard.transcripts s
+                WHERE s.filepath IN (SELECT filepath FROM main.transcripts) {duplicate_content}
+                """
+            )
+            cur.execute("SELECT COUNT(*) FROM temp.skipped_transcripts")
+            n_skipped = cur.fetchone()[0]
+            skipped += n_skipped
+            if n_skipped:
+                partial.add(path)
+
+            params = {'t': transcript_offset, 'm': message_offset}
+            cur.execute(
+                """
+                INSERT INTO main.transcripts (id, filepath, timestamp, message_count, content_hash)
+                SELECT id + :t, filepath, timestamp, message_count, content_hash
+                FROM shard.transcripts
+                WHERE id NOT IN (SELECT id FROM temp.skipped_transcripts)
+                """,
+                params
+            )
+            cur.execute(
+                f"""
+                INSERT INTO main.messages
+                (id, transcript_id, tag, speaker_type, speaker_id, position, previous_message_id,
+                 name, role, text, text_hash, word_count)
+                SELECT m.id + :m, m.transcript_id + :t, m.tag, m.speaker_type, sm.new_id, m.position,
+                       m.previous_message_id + :m, m.name, m.role, {text_column}, m.text_hash, m.word_count
+                FROM shard.messages m
+                JOIN temp.speaker_map sm ON sm.old_id = m.speaker_id
+                WHERE m.transcript_id NOT IN (SELECT id FROM temp.skipped_transcripts)
+                ORDER BY m.id
+                """,
+                params
+            )
+            cur.execute(
+                """
+                INSERT INTO main.turns
+                (user_message_id, lyra_message_id, transcript_id, user_speaker_id,
+                 user_word_count, lyra_word_count, turn_gap)
+                SELECT t.user_message_id + :m, t.lyra_message_id + :m, t.transcript_id + :t, sm.new_id,
+                       t.user_word_count, t.lyra_word_count, t.turn_gap
+                FROM shard.turns t
+                JOIN temp.speaker_map sm ON sm.old_id = t.user_speaker_id
+                WHERE t.transcript_id NOT IN (SELECT id FROM temp.skipped_transcripts)
+                """,
+                params
+            )
+            cur.execute(
+                """
+                INSERT INTO main.phrases (text, num_words, filepath, message_id)
+                SELECT text, num_words, filepath, message_id + :m
+                FROM shard.phrases
+                WHERE filepath NOT IN (SELECT filepath FROM temp.skipped_transcripts)
+                """,
+                params
+            )
+            cur.execute(
+                """
+                INSERT INTO main.excluded_tags (transcript_id, tag, message_count)
+                SELECT transcript_id + :t, tag, message_count
+                FROM shard.excluded_tags
+                WHERE transcript_id NOT IN (SELECT id FROM temp.skipped_transcripts)
+                """,
+                params
+            )
+            conn.commit()
+            cur.execute("DETACH DATABASE shard")
+
+        generation = max(shard['generation'] for shard in settings) + 1
+        set_meta(cur, 'ingest_generation', generation)
+        _merge_phrase_caches(cur, shard_paths, generation, partial)
+        build_message_sample(conn, cur, max(shard['sample_rate'] for shard in settings))
+
+        cur.execute("SELECT COUNT(*) FROM transcripts")
+        n_transcripts = cur.fetchone()[0]
+        cur.execute("SELECT COUNT(*) FROM messages")
+        n_messages = cur.fetchone()[0]
+        conn.commit()
+        cur.execute("PRAGMA journal_mode = WAL;")
+    finally:
+        conn.close()
+
+    return {
+        'shards': len(shard_paths),
+        'transcripts': n_transcripts,
+        'messages': n_messages,
+        'transcripts_skipped': skipped,
+    }
+
+
+def connect_shards(shard_paths: List[str]):
+    """
+    Returns a connection on which the `run_dashboard` / `query_service`
+    queries fan out across the shard databases without merging them.
+
+    The shards are attached read-only and the tables the queries read are
+    temporary views over all of them (UNION ALL), with ids offset by
+    SHARD_ID_STRIDE per shard, speakers unified by (speaker_type, name)
+    and compressed text decoded by each shard's own codec. Transcripts
+    `merge_shards` would skip (same file path, or same content unless
+    `count_duplicates`, as an earlier shard) are hidden. Lazy phrase
+    counts are cached in temporary tables for the life of the connection.
+    SQLite attaches at most 10 databases by default.
+    """
+    settings = _check_compatible(shard_paths)
+
+    conn = sqlite3.connect("file::memory:", uri=True, check_same_thread=False)
+    cur = conn.cursor()
+    for k, path in enumerate(shard_paths):
+        cur.execute(f"ATTACH DATABASE ? AS s{k}", (f"file:{os.path.abspath(path)}?mode=ro",))
+
+    decoders = [shard['codec'].decode if shard['codec'] is not None else None for shard in settings]
+    conn.create_function(
+        "shard_text", 2, lambda k, value: decoders[k](value) if decoders[k] else value, deterministic=True
+    )
+
+    cur.execute("CREATE TEMP TABLE speakers (id INTEGER PRIMARY KEY, speaker_type TEXT, name TEXT, UNIQUE(speaker_type, name))")
+    cur.execute("CREATE TEMP TABLE speaker_map (shard INTEGER, old_id INTEGER, new_id INTEGER, PRIMARY KEY (shard, old_id))")
+    for k in range(len(shard_paths)):
+        cur.execute(f"INSERT OR IGNORE INTO temp.speakers (speaker_type, name) SELECT speaker_type, name FROM s{k}.speakers")
+        cur.execute(
+            f"""
+            INSERT INTO temp.speaker_map (shard, old_id, new_id)
+            SELECT {k}, s.id, u.id FROM s{k}.speakers s
+            JOIN temp.speakers u ON u.speaker_type = s.speaker_type AND u.name IS s.name
+            """
+        )
+    cur.execute("CREATE INDEX temp.idx_speaker_map_new ON speaker_map (new_id, shard, old_id)")
+
+    cur.execute("CREATE TEMP TABLE shadowed (shard INTEGER, transcript_id INTEGER, filepath TEXT, PRIMARY KEY (shard, transcript_id))")
+    for k in range(1, len(shard_paths)):
+        for j in range(k):
+            duplicate_content = "" if settings[0]['count_duplicates'] else (
+                f"OR t.content_hash IN (SELECT content_hash FROM s{j}.transcripts "
+                f"WHERE id NOT IN (SELECT transcript_id FROM temp.shadowed WHERE shard = {j}))"
+            )
+            cur.execute(
+                f"""
+                INSERT OR IGNORE INTO temp.shadowed (shard, transcript_id, filepath)
+                SELECT {k}, t.id, t.filepath FROM s{k}.transcripts t
+                WHERE t.filepath IN (SELECT filepath FROM s{j}.transcripts) {duplicate_content}
+                """
+            )
+
+    def union(select):
+        return "\nUNION ALL\n".join(
+            select.format(k=k, offset=k * SHARD_ID_STRIDE) for k in range(len(shard_paths))
+        )
+
+    text = "shard_text({k}, m.text)" if any(decoders) else "m.text"
+    visible = "NOT IN (SELECT transcript_id FROM temp.shadowed WHERE shard = {k})"
+    views = {
+        'transcripts': f"""
+            SELECT id + {{offset}} AS id, filepath, timestamp, message_count, content_hash FROM s{{k}}.transcripts
+            WHERE id {visible}""",
+        'messages': f"""
+            SELECT m.id + {{offset}} AS id, m.transcript_id + {{offset}} AS transcript_id, m.tag, m.speaker_type,
+                   sm.new_id AS speaker_id, m.position, m.previous_message_id + {{offset}} AS previous_message_id,
+                   m.name, m.role, {text} AS text, m.text_hash, m.word_count
+            FROM s{{k}}.messages m JOIN temp.speaker_map sm ON sm.shard = {{k}} AND sm.old_id = m.speaker_id
+            WHERE m.transcript_id {visible}""",
+        'phrases': """
+            SELECT text, num_words, filepath, message_id + {offset} AS message_id FROM s{k}.phrases
+            WHERE filepath NOT IN (SELECT filepath FROM temp.shadowed WHERE shard = {k})""",
+        'turns': f"""
+            SELECT t.user_message_id + {{offset}} AS user_message_id, t.lyra_message_id + {{offset}} AS lyra_message_id,
+                   t.transcript_id + {{offset}} AS transcript_id, sm.new_id AS user_speaker_id,
+                   t.user_word_count, t.lyra_word_count, t.turn_gap
+            FROM s{{k}}.turns t JOIN temp.speaker_map sm ON sm.shard = {{k}} AND sm.old_id = t.user_speaker_id
+            WHERE t.transcript_id {visible}""",
+        'message_sample': """
+            SELECT s.message_id + {offset} AS message_id, s.speaker_type, sm.new_id AS speaker_id,
+                   s.day, s.word_count, s.weight
+            FROM s{k}.message_sample s JOIN temp.speaker_map sm ON sm.shard = {k} AND sm.old_id = s.speaker_id
+            WHERE s.message_id NOT IN (
+                SELECT id FROM s{k}.messages WHERE transcript_id IN (SELECT transcript_id FROM temp.shadowed WHERE shard = {k})
+            )""",
+        'excluded_tags': f"""
+            SELECT transcript_id + {{offset}} AS transcript_id, tag, message_count FROM s{{k}}.excluded_tags
+            WHERE transcript_id {visible}""",
+    }
+    for name, select in views.items():
+        cur.execute(f"CREATE TEMP VIEW {name} AS {union(select)}")
+
+    # Settings as seen by the query functions: text arrives decoded through
+    # the views, and lazy phrase counts go to connection-local tables.
+    cur.execute("CREATE TEMP TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+    cur.execute("CREATE TEMP TABLE filter_rules (version INTEGER PRIMARY KEY, rules TEXT NOT NULL, created_at TEXT)")
+    cur.execute("CREATE TEMP TABLE text_dictionary (codec TEXT PRIMARY KEY, dictionary BLOB)")
+    cur.execute("CREATE TEMP TABLE phrase_cache_entries (cache_key TEXT PRIMARY KEY, generation INTEGER NOT NULL, messages_scanned INTEGER)")
+    cur.execute("CREATE TEMP TABLE phrase_cache (cache_key TEXT NOT NULL, generation INTEGER NOT NULL, text TEXT, frequency INTEGER)")
+    cur.execute("CREATE INDEX temp.idx_phrase_cache_key ON phrase_cache (cache_key, generation, frequency DESC)")
+    set_meta(cur, 'phrase_mode', settings[0]['phrase_mode'])
+    set_meta(cur, 'text_compression', 'none')
+    set_meta(cur, 'ingest_generation', 0)
+    if settings[0]['filter_rules'] is not None:
+        save_filter_rules(cur, settings[0]['filter_rules'])
+    conn.commit()
+    return conn
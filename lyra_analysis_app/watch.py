@@ -0,0 +1,211 @@
+'''
+Continuous ingest of a transcripts folder.
+
+`watch` polls the folder, waits until each new .txt file has stopped
+changing, and appends the ready files in batches, each one an
+incremental `ingest_data(..., files=batch)` run committed as a single
+transaction. Existing rows, indexes and turns are kept; only the
+`message_sample` strata a batch touches are rebuilt and cached lazy
+phrase statistics are extended with the new messages, so a batch costs
+roughly the same however large the database is. Dashboard readers use
+WAL and see each batch as soon as it commits; the query service's cache
+follows the database version and the dashboard's "Live updates" option
+reruns the panels when the ingest generation changes.
+
+    python -m lyra_analysis_app watch TRANSCRIPTS --db lyra_transcripts.db
+
+A file is ingested at most about `settle_seconds` + `poll_interval` +
+the batch's ingest time after its last write. Files are matched by
+name: a transcript that changes after it was ingested is not re-read.
+
+A batch that fails (a file removed or truncated mid-read, a decode
+error, `database is locked`) is rolled back and reported, and the
+watcher keeps going. Its files are retried one at a time after
+`retry_delay` seconds, doubling on each failure up to MAX_RETRY_DELAY,
+and are given up after `max_attempts` failed attempts, unless the
+database itself was the problem (sqlite3.OperationalError, e.g. locked
+by another writer), which is retried indefinitely.
+'''
+
+from dataclasses import replace
+from typing import List, Optional
+import os
+import sqlite3
+import time
+
+from .ingest_transcripts_sqlite import DB_PATH, IngestOptions, ingest_data
+
+# Seconds between directory scans.
+POLL_INTERVAL = 1.0
+# A new file is ingested once its size and mtime have not changed for this long,
+# so files still being written or copied in are not read half-finished.
+SETTLE_SECONDS = 2.0
+# Upper bound on transcripts per batch, which bounds the time one commit takes.
+MAX_BATCH_FILES = 200
+# Seconds before the files of a failed batch are retried (doubled after every
+# further failure), and failed attempts after which a file is given up.
+RETRY_DELAY = 5.0
+MAX_RETRY_DELAY = 60.0
+MAX_ATTEMPTS = 5
+
+
+class DirectoryWatcher:
+    """
+    Polls `data_path` for .txt files whose names are not in `known` and
+    reports them once they have settled. `known` grows as batches are done
+    or files are given up.
+    """
+
+    def __init__(
+        self,
+        data_path: str,
+        known=(),
+        settle_seconds: float = SETTLE_SECONDS,
+        retry_delay: float = RETRY_DELAY,
+        max_attempts: int = MAX_ATTEMPTS
+    ):
+        self.data_path = data_path
+        self.known = set(known)
+        self.settle_seconds = settle_seconds
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        # name -> ((size, mtime_ns), when that stat was first seen)
+        self.pending = {}
+        # name -> when the file was first seen, for latency reporting
+        self.first_seen = {}
+        # name -> (failed attempts, when it may be retried)
+        self.failures = {}
+
+    def poll(self, now: Optional[float] = None):
+        """Returns the sorted names of new files that have settled."""
+        now = time.monotonic() if now is None else now
+        ready = []
+        present = set()
+        with os.scandir(self.data_path) as entries:
+            for entry in entries:
+                name = entry.name
+                if not name.endswith('.txt') or name in self.known:
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                present.add(name)
+                failure = self.failures.get(name)
+                if failure is not None and now < failure[1]:
+                    continue
+                signature = (stat.st_size, stat.st_mtime_ns)
+                seen = self.pending.get(name)
+                if seen is None or seen[0] != signature:
+                    seen = self.pending[name] = (signature, now)
+                    self.first_seen.setdefault(name, now)
+                if now - seen[1] >= self.settle_seconds:
+                    ready.append(name)
+        for name in list(self.pending):
+            if name not in present:
+                del self.pending[name]
+                self.first_seen.pop(name, None)
+                self.failures.pop(name, None)
+        return sorted(ready)
+
+    def mark_done(self, names: List[str]):
+        self.known.update(names)
+        for name in names:
+            self.pending.pop(name, None)
+            self.first_seen.pop(name, None)
+            self.failures.pop(name, None)
+
+    def mark_failed(self, names: List[str], now: Optional[float] = None, give_up: bool = True):
+        """
+        Schedules `names` for a retry after a failed batch, with an
+        exponential backoff. Returns the names that reached `max_attempts`;
+        those are given up (treated as done) unless `give_up` is False.
+        """
+        now = time.monotonic() if now is None else now
+        given_up = []
+        for name in names:
+            attempts = self.failures.get(name, (0, now))[0] + 1
+            if give_up and attempts >= self.max_attempts:
+                given_up.append(name)
+            else:
+                delay = min(self.retry_delay * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+                self.failures[name] = (attempts, now + delay)
+        self.mark_done(given_up)
+        return given_up
+
+    def batches(self, ready: List[str], max_batch_files: int):
+        """Splits `ready` into batches; files that failed before go alone, so one bad file can't sink others."""
+        retried = [name for name in ready if name in self.failures]
+        fresh = [name for name in ready if name not in self.failures]
+        return [[name] for name in retried] + [
+            fresh[i:i + max_batch_files] for i in range(0, len(fresh), max_batch_files)
+        ]
+
+
+def ingested_names(db_path: str, data_path: str):
+    """Names of the files in `data_path` that `db_path` already has transcripts for."""
+    if not os.path.exists(db_path):
+        return set()
+    prefix = os.path.join(data_path, "")
+    conn = sqlite3.connect(db_path)
+    try:
+        try:
+            rows = conn.execute("SELECT filepath FROM transcripts").fetchall()
+        except sqlite3.OperationalError:
+            return set()
+    finally:
+        conn.close()
+    return {path[len(prefix):] for path, in rows if path.startswith(prefix)}
+
+
+def watch(
+    data_path: str,
+    db_path: str = DB_PATH,
+    poll_interval: float = POLL_INTERVAL,
+    settle_seconds: float = SETTLE_SECONDS,
+    max_batch_files: int = MAX_BATCH_FILES,
+    options: Optional[IngestOptions] = None,
+    retry_delay: float = RETRY_DELAY,
+    max_attempts: int = MAX_ATTEMPTS
+):
+    """
+    Ingests new transcripts from `data_path` into `db_path` as they arrive.
+
+    A generator: after each committed batch it yields
+    {'files', 'latency_s', 'report'}, where `latency_s` is the longest
+    time a file of the batch waited between being first seen and being
+    committed, and `report` is the batch's IngestMetrics report. After a
+    failed batch it yields {'files', 'error', 'given_up'} with the
+    exception and the files that will not be retried. It runs until the
+    caller stops iterating (or on KeyboardInterrupt). Files already in
+    the database are skipped, so it can be restarted at any time.
+    `options` are passed to `ingest_data` as an incremental run without
+    progress output or a metrics file; the phrase mode, codec and filter
+    rules only matter for a new database.
+    """
+    options = replace(options or IngestOptions(), incremental=True, metrics_path=None, progress=False)
+    watcher = DirectoryWatcher(
+        data_path, ingested_names(db_path, data_path), settle_seconds, retry_delay, max_attempts
+    )
+    while True:
+        # Drain a backlog in consecutive batches before sleeping again.
+        for batch in watcher.batches(watcher.poll(), max_batch_files):
+            batch = [name for name in batch if os.path.exists(os.path.join(data_path, name))]
+            if not batch:
+                continue
+            try:
+                report = ingest_data(data_path, db_path, options, files=batch)
+            except Exception as e:
+                # ingest_data closes its connection without committing, so nothing
+                # of the batch was written; its files are retried later. A locked
+                # or busy database is not the files' fault, so they are never given up.
+                given_up = watcher.mark_failed(batch, give_up=not isinstance(e, sqlite3.OperationalError))
+                yield {'files': batch, 'error': e, 'given_up': given_up}
+                continue
+            committed = time.monotonic()
+            latency = max(committed - watcher.first_seen.get(name, committed) for name in batch)
+            watcher.mark_done(batch)
+            yield {'files': batch, 'latency_s': latency, 'report': report}
+        time.sleep(poll_interval)